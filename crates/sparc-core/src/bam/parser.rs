@@ -9,15 +9,28 @@ use std::path::Path;
 pub struct BamParser {
     reader: bam::Reader,
     header: bam::Header,
+    min_mapq: u8,
 }
 
 impl BamParser {
     /// Open a BAM file
     pub fn open<P: AsRef<Path>>(path: P) -> Result<Self> {
+        Self::with_min_mapq(path, 0)
+    }
+
+    /// Open a BAM file, skipping records with mapping quality below `min_mapq`
+    ///
+    /// Filtered records are dropped before conversion, so they never cost a
+    /// `BamRecord` allocation.
+    pub fn with_min_mapq<P: AsRef<Path>>(path: P, min_mapq: u8) -> Result<Self> {
         let reader = bam::Reader::from_path(path.as_ref())
             .map_err(|e| Error::BamParse(format!("Failed to open BAM: {}", e)))?;
         let header = bam::Header::from_template(reader.header());
-        Ok(Self { reader, header })
+        Ok(Self {
+            reader,
+            header,
+            min_mapq,
+        })
     }
 
     /// Get the header
@@ -81,13 +94,37 @@ impl BamParser {
         bam_record
     }
 
+    /// Read the next record passing the mapping quality filter into `record`
+    ///
+    /// Returns `Ok(false)` at end of file.
+    fn read_next(&mut self, record: &mut bam::Record) -> Result<bool> {
+        while let Some(result) = self.reader.read(record) {
+            result.map_err(|e| Error::BamParse(e.to_string()))?;
+            if record.mapq() >= self.min_mapq {
+                return Ok(true);
+            }
+        }
+        Ok(false)
+    }
+
     /// Read all records
     pub fn read_all(&mut self) -> Result<Vec<BamRecord>> {
         let mut records = Vec::new();
         let mut record = bam::Record::new();
 
-        while let Some(result) = self.reader.read(&mut record) {
-            result.map_err(|e| Error::BamParse(e.to_string()))?;
+        while self.read_next(&mut record)? {
+            records.push(self.convert_record(&record));
+        }
+
+        Ok(records)
+    }
+
+    /// Read up to `max_records` records; an empty batch means end of file
+    pub fn next_batch(&mut self, max_records: usize) -> Result<Vec<BamRecord>> {
+        let mut records = Vec::with_capacity(max_records);
+        let mut record = bam::Record::new();
+
+        while records.len() < max_records && self.read_next(&mut record)? {
             records.push(self.convert_record(&record));
         }
 
@@ -115,10 +152,10 @@ impl Iterator for BamParser {
 
     fn next(&mut self) -> Option<Self::Item> {
         let mut record = bam::Record::new();
-        match self.reader.read(&mut record) {
-            Some(Ok(())) => Some(Ok(self.convert_record(&record))),
-            Some(Err(e)) => Some(Err(Error::BamParse(e.to_string()))),
-            None => None,
+        match self.read_next(&mut record) {
+            Ok(true) => Some(Ok(self.convert_record(&record))),
+            Ok(false) => None,
+            Err(e) => Some(Err(e)),
         }
     }
 }
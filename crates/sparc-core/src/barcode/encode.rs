@@ -0,0 +1,90 @@
+//! 2-bit packed barcode encoding
+//!
+//! Barcodes of up to 32 bases are packed into a `u64`, two bits per base
+//! (A=00, C=01, G=10, T=11), first base in the most significant position.
+
+/// Maximum barcode length that fits the packed encoding
+pub const MAX_ENCODED_LEN: usize = 32;
+
+/// Marks bytes that are not `A`, `C`, `G` or `T` in [`BASE_CODES`]
+const INVALID_BASE: u8 = 0x80;
+
+/// 2-bit code of every byte, or [`INVALID_BASE`]
+const BASE_CODES: [u8; 256] = {
+    let mut table = [INVALID_BASE; 256];
+    table[b'A' as usize] = 0;
+    table[b'C' as usize] = 1;
+    table[b'G' as usize] = 2;
+    table[b'T' as usize] = 3;
+    table
+};
+
+/// Pack a sequence into a `u64`
+///
+/// Returns `None` if the sequence is longer than [`MAX_ENCODED_LEN`] or
+/// contains anything other than `A`, `C`, `G` or `T`.
+#[inline]
+pub fn encode_barcode(seq: &[u8]) -> Option<u64> {
+    if seq.len() > MAX_ENCODED_LEN {
+        return None;
+    }
+    // Table lookups with no per-base branch; invalid bases are checked once at the end
+    let mut code = 0u64;
+    let mut invalid = 0u8;
+    for &base in seq {
+        let bits = BASE_CODES[base as usize];
+        invalid |= bits;
+        code = (code << 2) | (bits & 0b11) as u64;
+    }
+    (invalid & INVALID_BASE == 0).then_some(code)
+}
+
+/// Unpack a `len`-base barcode produced by [`encode_barcode`]
+pub fn decode_barcode(code: u64, len: usize) -> String {
+    let mut out = Vec::with_capacity(len);
+    decode_barcode_into(code, len, &mut out);
+    String::from_utf8(out).expect("decoded barcodes are ASCII")
+}
+
+/// Unpack a `len`-base barcode, appending its bases to `out`
+#[inline]
+pub fn decode_barcode_into(code: u64, len: usize, out: &mut Vec<u8>) {
+    out.extend((0..len).map(|i| b"ACGT"[((code >> (2 * (len - 1 - i))) & 0b11) as usize]));
+}
+
+/// Hamming distance between two packed barcodes of the same length
+#[inline]
+pub fn encoded_hamming(a: u64, b: u64) -> u32 {
+    let diff = a ^ b;
+    // Fold each 2-bit lane onto its low bit, then count differing lanes
+    ((diff | (diff >> 1)) & 0x5555_5555_5555_5555).count_ones()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_encode_roundtrip() {
+        let code = encode_barcode(b"ACGTTGCA").unwrap();
+        assert_eq!(code, 0b00_01_10_11_11_10_01_00);
+        assert_eq!(decode_barcode(code, 8), "ACGTTGCA");
+
+        let long = "T".repeat(MAX_ENCODED_LEN);
+        assert_eq!(encode_barcode(long.as_bytes()), Some(u64::MAX));
+        assert_eq!(decode_barcode(u64::MAX, MAX_ENCODED_LEN), long);
+
+        assert_eq!(encode_barcode(b"ACGN"), None);
+        assert_eq!(encode_barcode(b"acgt"), None);
+        assert_eq!(encode_barcode("A".repeat(33).as_bytes()), None);
+    }
+
+    #[test]
+    fn test_encoded_hamming() {
+        let a = encode_barcode(b"AAAACCCC").unwrap();
+        assert_eq!(encoded_hamming(a, a), 0);
+        assert_eq!(encoded_hamming(a, encode_barcode(b"TAAACCCC").unwrap()), 1);
+        assert_eq!(encoded_hamming(a, encode_barcode(b"CAAACCCG").unwrap()), 2);
+        assert_eq!(encoded_hamming(a, encode_barcode(b"GGGGTTTT").unwrap()), 8);
+    }
+}
@@ -0,0 +1,265 @@
+//! Bulk barcode/UMI extraction from R1 reads
+
+use super::BarcodeCorrector;
+use crate::fastq::FastqRecord;
+use crate::{ReadStructure, Result};
+use std::sync::{mpsc, Arc, Mutex};
+use std::thread;
+
+/// Counters and packed sequences from an extraction pass
+///
+/// Barcodes and UMIs of accepted reads are stored back to back as fixed-width
+/// byte strings (`barcode_len` and `umi_len` bytes per read).
+#[derive(Debug, Default)]
+pub struct Extraction {
+    /// Total reads seen
+    pub total_reads: u64,
+    /// Reads with an exact or corrected barcode
+    pub valid_barcodes: u64,
+    /// Reads whose barcode was corrected
+    pub corrected_barcodes: u64,
+    /// Packed (corrected) barcodes of accepted reads
+    pub barcodes: Vec<u8>,
+    /// Packed UMIs of accepted reads
+    pub umis: Vec<u8>,
+}
+
+/// Records handed to a worker at a time by [`extract_barcodes_parallel`]
+const BATCH_SIZE: usize = 4096;
+/// Batches buffered between the reader and the workers
+const CHANNEL_DEPTH: usize = 8;
+
+/// Extract and correct barcodes/UMIs from a stream of R1 records
+///
+/// Reads shorter than the read structure, or whose mean barcode quality is
+/// below `min_quality`, are skipped.
+pub fn extract_barcodes<I>(
+    records: I,
+    corrector: &BarcodeCorrector,
+    read_structure: &ReadStructure,
+    min_quality: f64,
+) -> Result<Extraction>
+where
+    I: IntoIterator<Item = Result<FastqRecord>>,
+{
+    let mut out = Extraction::default();
+    for record in records {
+        extract_record(&record?, corrector, read_structure, min_quality, &mut out);
+    }
+    Ok(out)
+}
+
+/// Parallel version of [`extract_barcodes`]
+///
+/// The calling thread reads records into batches of 4096 and feeds them
+/// through a bounded channel to `threads` workers (0 = one per core).
+/// Results are concatenated in input order, so the output is identical to
+/// the serial version.
+pub fn extract_barcodes_parallel<I>(
+    records: I,
+    corrector: &BarcodeCorrector,
+    read_structure: &ReadStructure,
+    min_quality: f64,
+    threads: usize,
+) -> Result<Extraction>
+where
+    I: IntoIterator<Item = Result<FastqRecord>>,
+{
+    extract_batches_parallel(records, threads, |record, out| {
+        extract_record(record, corrector, read_structure, min_quality, out)
+    })
+}
+
+/// Run `process` over batches of `records` on `threads` workers, merging the
+/// per-batch results in input order
+fn extract_batches_parallel<I, F>(records: I, threads: usize, process: F) -> Result<Extraction>
+where
+    I: IntoIterator<Item = Result<FastqRecord>>,
+    F: Fn(&FastqRecord, &mut Extraction) + Sync,
+{
+    let threads = if threads == 0 {
+        thread::available_parallelism().map_or(1, |n| n.get())
+    } else {
+        threads
+    };
+
+    let (tx, rx) = mpsc::sync_channel::<(usize, Vec<FastqRecord>)>(CHANNEL_DEPTH);
+    // Only the workers hold the receiver, so if they all exit (even by
+    // panicking) it is dropped and the reader's sends fail instead of blocking
+    let rx = Arc::new(Mutex::new(rx));
+
+    thread::scope(|scope| {
+        let workers: Vec<_> = (0..threads)
+            .map(|_| {
+                let rx = Arc::clone(&rx);
+                let process = &process;
+                scope.spawn(move || {
+                    let mut parts = Vec::new();
+                    loop {
+                        let next = rx.lock().unwrap_or_else(|e| e.into_inner()).recv();
+                        let Ok((index, batch)) = next else { break };
+                        let mut out = Extraction::default();
+                        for record in &batch {
+                            process(record, &mut out);
+                        }
+                        parts.push((index, out));
+                    }
+                    parts
+                })
+            })
+            .collect();
+        drop(rx);
+
+        // Read on this thread; the channel bounds how far ahead we get
+        let mut read_result = Ok(());
+        let mut batch = Vec::with_capacity(BATCH_SIZE);
+        let mut n_batches = 0;
+        for record in records {
+            match record {
+                Ok(record) => batch.push(record),
+                Err(e) => {
+                    read_result = Err(e);
+                    break;
+                }
+            }
+            if batch.len() == BATCH_SIZE {
+                let full = std::mem::replace(&mut batch, Vec::with_capacity(BATCH_SIZE));
+                if tx.send((n_batches, full)).is_err() {
+                    break;
+                }
+                n_batches += 1;
+            }
+        }
+        if !batch.is_empty() && tx.send((n_batches, batch)).is_ok() {
+            n_batches += 1;
+        }
+        drop(tx);
+
+        let mut parts: Vec<(usize, Extraction)> = Vec::with_capacity(n_batches);
+        for worker in workers {
+            match worker.join() {
+                Ok(worker_parts) => parts.extend(worker_parts),
+                Err(panic) => std::panic::resume_unwind(panic),
+            }
+        }
+        read_result?;
+
+        parts.sort_unstable_by_key(|(index, _)| *index);
+        let mut out = Extraction::default();
+        for (_, part) in parts {
+            out.total_reads += part.total_reads;
+            out.valid_barcodes += part.valid_barcodes;
+            out.corrected_barcodes += part.corrected_barcodes;
+            out.barcodes.extend_from_slice(&part.barcodes);
+            out.umis.extend_from_slice(&part.umis);
+        }
+        Ok(out)
+    })
+}
+
+/// Process a single read into `out`
+fn extract_record(
+    record: &FastqRecord,
+    corrector: &BarcodeCorrector,
+    rs: &ReadStructure,
+    min_quality: f64,
+    out: &mut Extraction,
+) {
+    out.total_reads += 1;
+
+    if record.seq.len() < rs.barcode_start + rs.barcode_len + rs.umi_len {
+        return;
+    }
+
+    let (barcode, umi) = match (
+        record.subsequence(rs.barcode_start, rs.barcode_len),
+        record.subsequence(rs.umi_start, rs.umi_len),
+    ) {
+        (Some(barcode), Some(umi)) => (barcode, umi),
+        _ => return,
+    };
+
+    if min_quality > 0.0 {
+        match record.mean_quality_region(rs.barcode_start, rs.barcode_len) {
+            Some(q) if q >= min_quality => {}
+            _ => return,
+        }
+    }
+
+    // The corrected barcode is written straight into the packed output
+    let Some(dist) = corrector.match_bytes(barcode, &mut out.barcodes) else {
+        return;
+    };
+    if dist > 0 {
+        out.corrected_barcodes += 1;
+    }
+
+    out.valid_barcodes += 1;
+    out.umis.extend_from_slice(umi);
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::barcode::Whitelist;
+
+    fn record(seq: &[u8]) -> Result<FastqRecord> {
+        Ok(FastqRecord::new("r".to_string(), seq.to_vec(), vec![b'I'; seq.len()]))
+    }
+
+    #[test]
+    fn test_extract_barcodes() {
+        let whitelist = Whitelist::from_vec(vec!["AAAACCCC".to_string()]).unwrap();
+        let corrector = BarcodeCorrector::new(whitelist, 1);
+        let rs = ReadStructure::new(0, 8, 8, 4, 0);
+
+        let records = vec![
+            record(b"AAAACCCCGGTT"), // exact
+            record(b"TAAACCCCGGGG"), // corrected
+            record(b"TTTTTTTTGGGG"), // no match
+            record(b"AAAACCCC"),     // too short
+        ];
+
+        let out = extract_barcodes(records, &corrector, &rs, 10.0).unwrap();
+        assert_eq!(out.total_reads, 4);
+        assert_eq!(out.valid_barcodes, 2);
+        assert_eq!(out.corrected_barcodes, 1);
+        assert_eq!(out.barcodes, b"AAAACCCCAAAACCCC".to_vec());
+        assert_eq!(out.umis, b"GGTTGGGG".to_vec());
+    }
+
+    #[test]
+    fn test_extract_barcodes_parallel_matches_serial() {
+        let whitelist =
+            Whitelist::from_vec(vec!["AAAACCCC".to_string(), "GGGGTTTT".to_string()]).unwrap();
+        let corrector = BarcodeCorrector::new(whitelist, 1);
+        let rs = ReadStructure::new(0, 8, 8, 4, 0);
+
+        let seqs: [&[u8]; 4] = [b"AAAACCCCGGTT", b"TAAACCCCGGGG", b"GGGGTTTACCAA", b"TTTTTTTTGGGG"];
+        let records = || (0..3 * BATCH_SIZE + 17).map(|i| record(seqs[i % seqs.len()]));
+
+        let serial = extract_barcodes(records(), &corrector, &rs, 10.0).unwrap();
+        let parallel = extract_barcodes_parallel(records(), &corrector, &rs, 10.0, 3).unwrap();
+        assert_eq!(parallel.total_reads, serial.total_reads);
+        assert_eq!(parallel.valid_barcodes, serial.valid_barcodes);
+        assert_eq!(parallel.corrected_barcodes, serial.corrected_barcodes);
+        assert_eq!(parallel.barcodes, serial.barcodes);
+        assert_eq!(parallel.umis, serial.umis);
+
+        let failing = records()
+            .take(10)
+            .chain(std::iter::once(Err(crate::Error::FastqParse("bad".to_string()))));
+        assert!(extract_barcodes_parallel(failing, &corrector, &rs, 10.0, 2).is_err());
+    }
+
+    #[test]
+    fn test_extract_barcodes_parallel_worker_panic() {
+        // Far more batches than the channel buffers, so the reader would block
+        // forever if the panicked workers left the channel open
+        let records = (0..(CHANNEL_DEPTH + 4) * BATCH_SIZE).map(|_| record(b"AAAACCCCGGTT"));
+        let result = std::panic::catch_unwind(|| {
+            extract_batches_parallel(records, 2, |_, _| panic!("worker failed"))
+        });
+        assert!(result.is_err());
+    }
+}
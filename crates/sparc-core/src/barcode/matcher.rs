@@ -1,7 +1,10 @@
 //! Barcode matching and correction
 
-use super::{BarcodeMatch, Whitelist};
-use ahash::AHashMap;
+use super::segment::SegmentIndex;
+use super::{
+    decode_barcode, decode_barcode_into, encode_barcode, encoded_hamming, BarcodeMatch, Whitelist,
+    MAX_ENCODED_LEN,
+};
 
 /// Barcode matcher with exact matching
 pub struct BarcodeMatcher {
@@ -29,62 +32,44 @@ impl BarcodeMatcher {
 }
 
 /// Barcode corrector with fuzzy matching using Hamming distance
+///
+/// When every whitelist barcode is ACGT-only and at most 32 bases long, queries
+/// are matched in 2-bit packed form: exact lookup is a single `u64` probe and
+/// 1-mismatch correction probes the 3 x len neighbours of the query. Larger
+/// distances are searched through a pigeonhole index of `max_distance + 1`
+/// barcode segments.
 pub struct BarcodeCorrector {
     whitelist: Whitelist,
     /// Maximum Hamming distance for correction
     max_distance: u32,
-    /// Pre-computed index for 1-mismatch lookup
-    mismatch_index: AHashMap<String, Vec<String>>,
+    /// Segment index for corrections beyond one mismatch (packed whitelists only)
+    segment_index: Option<SegmentIndex>,
 }
 
 impl BarcodeCorrector {
     /// Create a new barcode corrector
     pub fn new(whitelist: Whitelist, max_distance: u32) -> Self {
         log::info!(
-            "Building barcode corrector (whitelist={} barcodes, max_distance={})",
+            "Building barcode corrector (whitelist={} barcodes, max_distance={}, packed={})",
             whitelist.len(),
-            max_distance
+            max_distance,
+            whitelist.encoded().is_some()
         );
-        let mismatch_index = if max_distance >= 1 {
-            Self::build_mismatch_index(&whitelist)
-        } else {
-            AHashMap::new()
+
+        let segment_index = match whitelist.encoded() {
+            Some(encoded) if max_distance > 1 => Some(SegmentIndex::new(
+                encoded.iter().copied().collect(),
+                whitelist.barcode_len(),
+                max_distance as usize + 1,
+            )),
+            _ => None,
         };
-        log::debug!(
-            "Mismatch index built ({} entries)",
-            mismatch_index.len()
-        );
 
         Self {
             whitelist,
             max_distance,
-            mismatch_index,
-        }
-    }
-
-    /// Build index for 1-mismatch lookup
-    fn build_mismatch_index(whitelist: &Whitelist) -> AHashMap<String, Vec<String>> {
-        let mut index: AHashMap<String, Vec<String>> = AHashMap::new();
-
-        for barcode in whitelist.iter() {
-            // Generate all 1-mismatch variants
-            let chars: Vec<char> = barcode.chars().collect();
-            for i in 0..chars.len() {
-                for &base in &['A', 'C', 'G', 'T', 'N'] {
-                    if chars[i] != base {
-                        let mut variant = chars.clone();
-                        variant[i] = base;
-                        let variant_str: String = variant.into_iter().collect();
-                        index
-                            .entry(variant_str)
-                            .or_default()
-                            .push(barcode.clone());
-                    }
-                }
-            }
+            segment_index,
         }
-
-        index
     }
 
     /// Calculate Hamming distance between two sequences
@@ -97,6 +82,137 @@ impl BarcodeCorrector {
 
     /// Match a barcode with correction
     pub fn match_barcode(&self, barcode: &str) -> BarcodeMatch {
+        if self.whitelist.encoded().is_some() {
+            if let Some(code) = encode_barcode(barcode.as_bytes()) {
+                if barcode.len() != self.whitelist.barcode_len() {
+                    return BarcodeMatch::NoMatch(barcode.to_string());
+                }
+                return match self.match_encoded(code) {
+                    Some((_, 0)) => BarcodeMatch::Exact(barcode.to_string()),
+                    Some((corrected, dist)) => BarcodeMatch::Corrected(
+                        barcode.to_string(),
+                        decode_barcode(corrected, barcode.len()),
+                        dist,
+                    ),
+                    None => BarcodeMatch::NoMatch(barcode.to_string()),
+                };
+            }
+        }
+
+        self.match_string(barcode)
+    }
+
+    /// Match a raw barcode, appending the whitelist barcode it resolves to onto `out`
+    ///
+    /// Returns the Hamming distance of the match, or `None` (leaving `out`
+    /// untouched) if there is no unambiguous match. Barcodes that can be
+    /// packed are matched without allocating.
+    pub fn match_bytes(&self, barcode: &[u8], out: &mut Vec<u8>) -> Option<u32> {
+        if self.whitelist.encoded().is_some() {
+            if let Some(code) = encode_barcode(barcode) {
+                if barcode.len() != self.whitelist.barcode_len() {
+                    return None;
+                }
+                let (matched, dist) = self.match_encoded(code)?;
+                if dist == 0 {
+                    out.extend_from_slice(barcode);
+                } else {
+                    decode_barcode_into(matched, barcode.len(), out);
+                }
+                return Some(dist);
+            }
+        }
+
+        match self.match_string(&String::from_utf8_lossy(barcode)) {
+            BarcodeMatch::Exact(bc) => {
+                out.extend_from_slice(bc.as_bytes());
+                Some(0)
+            }
+            BarcodeMatch::Corrected(_, bc, dist) => {
+                out.extend_from_slice(bc.as_bytes());
+                Some(dist)
+            }
+            BarcodeMatch::NoMatch(_) => None,
+        }
+    }
+
+    /// Match a 2-bit packed barcode of whitelist length
+    ///
+    /// Returns the packed whitelist barcode and its Hamming distance, or `None`
+    /// if there is no unambiguous match (or the whitelist is not packed).
+    pub fn match_encoded(&self, code: u64) -> Option<(u64, u32)> {
+        let encoded = self.whitelist.encoded()?;
+        if encoded.contains(&code) {
+            return Some((code, 0));
+        }
+
+        if self.max_distance == 0 {
+            return None;
+        }
+
+        // 1-mismatch lookup: XOR-ing a lane with 1, 2 or 3 yields the other bases
+        let mut candidate = None;
+        let mut n_candidates = 0;
+        for pos in 0..self.whitelist.barcode_len() {
+            for delta in 1..4u64 {
+                let neighbor = code ^ (delta << (2 * pos));
+                if encoded.contains(&neighbor) {
+                    candidate = Some(neighbor);
+                    n_candidates += 1;
+                }
+            }
+        }
+        match n_candidates {
+            0 => {}
+            1 => return candidate.map(|c| (c, 1)),
+            // Multiple candidates - ambiguous, no correction
+            _ => return None,
+        }
+
+        // For higher distances, search the segment index
+        self.search_segments(code, 0)
+    }
+
+    /// Find the closest whitelist barcode within `max_distance` via the segment index
+    ///
+    /// Lanes set in `n_mask` hold an `N` in the query and always count as
+    /// mismatches. Returns `None` if there is no match or the best is a tie.
+    fn search_segments(&self, code: u64, n_mask: u64) -> Option<(u64, u32)> {
+        let index = self.segment_index.as_ref()?;
+        let mut best_match: Option<(u64, u32)> = None;
+        let mut ambiguous = false;
+
+        index.for_each_candidate(code, |wl_code| {
+            let dist = if n_mask == 0 {
+                encoded_hamming(code, wl_code)
+            } else {
+                let diff = code ^ wl_code;
+                ((diff | (diff >> 1) | n_mask) & 0x5555_5555_5555_5555).count_ones()
+            };
+            if dist <= self.max_distance {
+                match best_match {
+                    None => best_match = Some((wl_code, dist)),
+                    Some((_, best_dist)) => {
+                        if dist < best_dist {
+                            best_match = Some((wl_code, dist));
+                            ambiguous = false;
+                        } else if dist == best_dist {
+                            ambiguous = true;
+                        }
+                    }
+                }
+            }
+        });
+
+        if ambiguous {
+            None
+        } else {
+            best_match
+        }
+    }
+
+    /// Match a barcode that cannot be packed (N bases, or an unpacked whitelist)
+    fn match_string(&self, barcode: &str) -> BarcodeMatch {
         // First try exact match
         if self.whitelist.contains(barcode) {
             return BarcodeMatch::Exact(barcode.to_string());
@@ -106,16 +222,52 @@ impl BarcodeCorrector {
             return BarcodeMatch::NoMatch(barcode.to_string());
         }
 
-        // Try 1-mismatch lookup using index
-        if let Some(candidates) = self.mismatch_index.get(barcode) {
-            if candidates.len() == 1 {
-                return BarcodeMatch::Corrected(barcode.to_string(), candidates[0].clone(), 1);
+        // Try 1-mismatch lookup by substituting each position
+        let mut variant = barcode.as_bytes().to_vec();
+        let mut candidates: Vec<String> = Vec::new();
+        for i in 0..variant.len() {
+            let original = variant[i];
+            if !b"ACGTN".contains(&original) {
+                continue;
             }
+            for &base in b"ACGTN" {
+                if base == original {
+                    continue;
+                }
+                variant[i] = base;
+                if let Ok(candidate) = std::str::from_utf8(&variant) {
+                    if self.whitelist.contains(candidate) {
+                        candidates.push(candidate.to_string());
+                    }
+                }
+            }
+            variant[i] = original;
+        }
+        if candidates.len() == 1 {
+            let corrected = candidates.pop().unwrap();
+            return BarcodeMatch::Corrected(barcode.to_string(), corrected, 1);
+        }
+        if candidates.len() > 1 {
             // Multiple candidates - ambiguous, no correction
             return BarcodeMatch::NoMatch(barcode.to_string());
         }
 
-        // For higher distances, do brute force search
+        if self.max_distance > 1 && self.segment_index.is_some() {
+            if let Some((code, n_mask)) = encode_with_n(barcode.as_bytes())
+                .filter(|_| barcode.len() == self.whitelist.barcode_len())
+            {
+                return match self.search_segments(code, n_mask) {
+                    Some((corrected, dist)) => BarcodeMatch::Corrected(
+                        barcode.to_string(),
+                        decode_barcode(corrected, barcode.len()),
+                        dist,
+                    ),
+                    None => BarcodeMatch::NoMatch(barcode.to_string()),
+                };
+            }
+        }
+
+        // Unpacked whitelist: brute force search
         if self.max_distance > 1 {
             let mut best_match: Option<(String, u32)> = None;
             let mut ambiguous = false;
@@ -148,6 +300,30 @@ impl BarcodeCorrector {
     }
 }
 
+/// Pack a sequence that may contain `N`, encoding `N` as `A`
+///
+/// Returns the packed code and a mask with the low bit of every `N` lane set.
+fn encode_with_n(seq: &[u8]) -> Option<(u64, u64)> {
+    if seq.len() > MAX_ENCODED_LEN {
+        return None;
+    }
+    let mut code = 0u64;
+    let mut n_mask = 0u64;
+    for &base in seq {
+        let (bits, is_n) = match base {
+            b'A' => (0, 0),
+            b'C' => (1, 0),
+            b'G' => (2, 0),
+            b'T' => (3, 0),
+            b'N' => (0, 1),
+            _ => return None,
+        };
+        code = (code << 2) | bits;
+        n_mask = (n_mask << 2) | is_n;
+    }
+    Some((code, n_mask))
+}
+
 #[cfg(test)]
 mod tests {
     use super::*;
@@ -189,4 +365,106 @@ mod tests {
         let result = corrector.match_barcode("TTACCCAAGAAACACT");
         assert!(matches!(result, BarcodeMatch::NoMatch(_)));
     }
+
+    #[test]
+    fn test_packed_matches_string_path() {
+        let barcodes = vec![
+            "AAAAAAAA".to_string(),
+            "AAAAAACC".to_string(),
+            "GGGGGGGG".to_string(),
+        ];
+        let whitelist = Whitelist::from_vec(barcodes).unwrap();
+        let corrector = BarcodeCorrector::new(whitelist, 2);
+
+        // Packed path
+        assert!(matches!(
+            corrector.match_barcode("GGGGGGGG"),
+            BarcodeMatch::Exact(_)
+        ));
+        match corrector.match_barcode("GGGAGGGG") {
+            BarcodeMatch::Corrected(_, bc, 1) => assert_eq!(bc, "GGGGGGGG"),
+            other => panic!("Expected 1-mismatch correction, got {:?}", other),
+        }
+        match corrector.match_barcode("GGAAGGGG") {
+            BarcodeMatch::Corrected(_, bc, 2) => assert_eq!(bc, "GGGGGGGG"),
+            other => panic!("Expected 2-mismatch correction, got {:?}", other),
+        }
+        // AAAAAAAC is one mismatch from two whitelist barcodes
+        assert!(matches!(
+            corrector.match_barcode("AAAAAAAC"),
+            BarcodeMatch::NoMatch(_)
+        ));
+        // Wrong length
+        assert!(matches!(
+            corrector.match_barcode("GGGG"),
+            BarcodeMatch::NoMatch(_)
+        ));
+
+        // String fallback for N bases
+        match corrector.match_barcode("GGGNGGGG") {
+            BarcodeMatch::Corrected(_, bc, 1) => assert_eq!(bc, "GGGGGGGG"),
+            other => panic!("Expected 1-mismatch correction, got {:?}", other),
+        }
+        match corrector.match_barcode("GGNNGGGG") {
+            BarcodeMatch::Corrected(_, bc, 2) => assert_eq!(bc, "GGGGGGGG"),
+            other => panic!("Expected 2-mismatch correction, got {:?}", other),
+        }
+    }
+
+    #[test]
+    fn test_match_bytes() {
+        let barcodes = vec!["AAAAAAAA".to_string(), "GGGGGGGG".to_string()];
+        let corrector = BarcodeCorrector::new(Whitelist::from_vec(barcodes).unwrap(), 1);
+
+        let mut out = b"x".to_vec();
+        assert_eq!(corrector.match_bytes(b"GGGGGGGG", &mut out), Some(0));
+        assert_eq!(corrector.match_bytes(b"GGGAGGGG", &mut out), Some(1));
+        assert_eq!(corrector.match_bytes(b"GGGNGGGG", &mut out), Some(1));
+        assert_eq!(corrector.match_bytes(b"GGAAGGGG", &mut out), None);
+        assert_eq!(corrector.match_bytes(b"GGGG", &mut out), None);
+        assert_eq!(out, b"xGGGGGGGGGGGGGGGGGGGGGGGG".to_vec());
+    }
+
+    #[test]
+    fn test_segment_index_matches_brute_force() {
+        // Deterministic pseudo-random 10-base whitelist
+        let mut state = 0x2545_f491_4f6c_dd1du64;
+        let mut next_barcode = || {
+            (0..10)
+                .map(|_| {
+                    state ^= state << 13;
+                    state ^= state >> 7;
+                    state ^= state << 17;
+                    b"ACGT"[(state >> 32) as usize % 4] as char
+                })
+                .collect::<String>()
+        };
+        let barcodes: Vec<String> = (0..300).map(|_| next_barcode()).collect();
+        let queries: Vec<String> = (0..300).map(|_| next_barcode()).collect();
+        let whitelist = Whitelist::from_vec(barcodes).unwrap();
+
+        for max_distance in 2..=3 {
+            let corrector = BarcodeCorrector::new(whitelist.clone(), max_distance);
+            for query in &queries {
+                let got = corrector.match_barcode(query).barcode().map(str::to_string);
+
+                // Reference: unique closest barcode, after the 1-mismatch step
+                let mut dists: Vec<(u32, &String)> = whitelist
+                    .iter()
+                    .map(|bc| (BarcodeCorrector::hamming_distance(query, bc), bc))
+                    .filter(|&(d, _)| d <= max_distance)
+                    .collect();
+                dists.sort();
+                let n_one = dists.iter().filter(|&&(d, _)| d == 1).count();
+                let expected = match dists.as_slice() {
+                    [] => None,
+                    [(0, bc), ..] => Some((*bc).clone()),
+                    _ if n_one > 1 => None,
+                    [(d, _), (d2, _), ..] if d == d2 => None,
+                    [(_, bc), ..] => Some((*bc).clone()),
+                };
+                assert_eq!(got, expected, "query {} at distance {}", query, max_distance);
+            }
+        }
+    }
 }
@@ -1,8 +1,15 @@
 //! Barcode detection and matching module
 
+mod encode;
+mod extract;
 mod matcher;
+mod segment;
 mod whitelist;
 
+pub use encode::{
+    decode_barcode, decode_barcode_into, encode_barcode, encoded_hamming, MAX_ENCODED_LEN,
+};
+pub use extract::{extract_barcodes, extract_barcodes_parallel, Extraction};
 pub use matcher::{BarcodeCorrector, BarcodeMatcher};
 pub use whitelist::Whitelist;
 
@@ -0,0 +1,119 @@
+//! Pigeonhole segment index over 2-bit packed barcodes
+//!
+//! Splitting barcodes into `d + 1` segments guarantees that any barcode within
+//! Hamming distance `d` of a query matches it exactly on at least one segment,
+//! so candidates come from `d + 1` hash lookups instead of a whitelist scan.
+
+use ahash::AHashMap;
+
+/// One segment: packed sub-sequence -> range of barcode ids sharing it
+struct Segment {
+    shift: u32,
+    mask: u64,
+    buckets: AHashMap<u64, (u32, u32)>,
+    ids: Vec<u32>,
+}
+
+impl Segment {
+    #[inline]
+    fn key(&self, code: u64) -> u64 {
+        (code >> self.shift) & self.mask
+    }
+}
+
+/// Segment index over packed barcodes of a single length
+pub(super) struct SegmentIndex {
+    codes: Vec<u64>,
+    segments: Vec<Segment>,
+}
+
+impl SegmentIndex {
+    /// Index `codes` (packed barcodes of `len` bases) in `n_segments` segments
+    pub(super) fn new(codes: Vec<u64>, len: usize, n_segments: usize) -> Self {
+        let n_segments = n_segments.max(1);
+        let segments = (0..n_segments)
+            .map(|s| {
+                // Bases [start, end); the first base is the most significant lane
+                let start = s * len / n_segments;
+                let end = (s + 1) * len / n_segments;
+                let width = 2 * (end - start) as u32;
+                let mask = if width >= 64 { u64::MAX } else { (1u64 << width) - 1 };
+                let shift = 2 * (len - end) as u32;
+                let key = |id: u32| (codes[id as usize] >> shift) & mask;
+
+                // Sort ids by segment value, then record each run as a bucket
+                let mut ids: Vec<u32> = (0..codes.len() as u32).collect();
+                ids.sort_unstable_by_key(|&id| key(id));
+                let mut buckets = AHashMap::new();
+                let mut run_start = 0;
+                for i in 1..=ids.len() {
+                    if i == ids.len() || key(ids[i]) != key(ids[run_start]) {
+                        buckets.insert(key(ids[run_start]), (run_start as u32, i as u32));
+                        run_start = i;
+                    }
+                }
+
+                Segment {
+                    shift,
+                    mask,
+                    buckets,
+                    ids,
+                }
+            })
+            .collect();
+
+        Self { codes, segments }
+    }
+
+    /// Call `f` once for every indexed barcode sharing a segment with `code`
+    pub(super) fn for_each_candidate(&self, code: u64, mut f: impl FnMut(u64)) {
+        for (s, segment) in self.segments.iter().enumerate() {
+            let Some(&(start, end)) = segment.buckets.get(&segment.key(code)) else {
+                continue;
+            };
+            for &id in &segment.ids[start as usize..end as usize] {
+                let candidate = self.codes[id as usize];
+                // Report each barcode from the first segment it shares with the query
+                if self.segments[..s]
+                    .iter()
+                    .any(|earlier| earlier.key(candidate) == earlier.key(code))
+                {
+                    continue;
+                }
+                f(candidate);
+            }
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::barcode::{encode_barcode, encoded_hamming};
+
+    #[test]
+    fn test_segment_index_finds_all_within_distance() {
+        let whitelist = ["AAAAAAAAA", "AAAAAATTT", "CCCAAAAAA", "GGGGGGGGG"];
+        let codes: Vec<u64> = whitelist
+            .iter()
+            .map(|bc| encode_barcode(bc.as_bytes()).unwrap())
+            .collect();
+        let index = SegmentIndex::new(codes.clone(), 9, 3);
+
+        let query = encode_barcode(b"AAAAAAATT").unwrap();
+        let mut found = Vec::new();
+        index.for_each_candidate(query, |c| found.push(c));
+
+        // Every barcode within distance 2 is reported exactly once
+        let mut expected: Vec<u64> = codes
+            .iter()
+            .copied()
+            .filter(|&c| encoded_hamming(query, c) <= 2)
+            .collect();
+        found.retain(|&c| encoded_hamming(query, c) <= 2);
+        found.sort_unstable();
+        expected.sort_unstable();
+        assert_eq!(found, expected);
+        assert_eq!(found.len(), 2);
+    }
+}
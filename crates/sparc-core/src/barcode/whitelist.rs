@@ -1,5 +1,6 @@
 //! Barcode whitelist handling
 
+use super::encode_barcode;
 use crate::{Error, Result};
 use ahash::AHashSet;
 use std::fs::File;
@@ -11,6 +12,8 @@ use std::path::Path;
 pub struct Whitelist {
     barcodes: AHashSet<String>,
     barcode_len: usize,
+    /// 2-bit packed barcodes, present when every barcode is encodable
+    encoded: Option<AHashSet<u64>>,
 }
 
 impl Whitelist {
@@ -19,6 +22,7 @@ impl Whitelist {
         Self {
             barcodes: AHashSet::new(),
             barcode_len: 0,
+            encoded: None,
         }
     }
 
@@ -56,9 +60,11 @@ impl Whitelist {
             barcode_len
         );
 
+        let encoded = Self::encode_all(&barcodes);
         Ok(Self {
             barcodes,
             barcode_len,
+            encoded,
         })
     }
 
@@ -79,17 +85,40 @@ impl Whitelist {
             }
         }
 
+        let barcodes: AHashSet<String> = barcodes.into_iter().collect();
+        let encoded = Self::encode_all(&barcodes);
         Ok(Self {
-            barcodes: barcodes.into_iter().collect(),
+            barcodes,
             barcode_len,
+            encoded,
         })
     }
 
+    /// Pack all barcodes, or `None` if any of them cannot be encoded
+    fn encode_all(barcodes: &AHashSet<String>) -> Option<AHashSet<u64>> {
+        barcodes
+            .iter()
+            .map(|bc| encode_barcode(bc.as_bytes()))
+            .collect()
+    }
+
     /// Check if a barcode is in the whitelist
     pub fn contains(&self, barcode: &str) -> bool {
         self.barcodes.contains(barcode)
     }
 
+    /// Check if a 2-bit packed barcode is in the whitelist
+    pub fn contains_encoded(&self, code: u64) -> bool {
+        self.encoded
+            .as_ref()
+            .is_some_and(|encoded| encoded.contains(&code))
+    }
+
+    /// Get the 2-bit packed barcodes, if every barcode is encodable
+    pub fn encoded(&self) -> Option<&AHashSet<u64>> {
+        self.encoded.as_ref()
+    }
+
     /// Get the number of barcodes
     pub fn len(&self) -> usize {
         self.barcodes.len()
@@ -140,4 +169,18 @@ mod tests {
         assert!(whitelist.contains("AAACCCAAGAAACACT"));
         assert!(!whitelist.contains("AAACCCAAGAAACXXX"));
     }
+
+    #[test]
+    fn test_whitelist_encoded() {
+        let whitelist =
+            Whitelist::from_vec(vec!["ACGT".to_string(), "TTTT".to_string()]).unwrap();
+        assert_eq!(whitelist.encoded().map(|e| e.len()), Some(2));
+        assert!(whitelist.contains_encoded(encode_barcode(b"ACGT").unwrap()));
+        assert!(!whitelist.contains_encoded(encode_barcode(b"AAAA").unwrap()));
+
+        let whitelist =
+            Whitelist::from_vec(vec!["ACGT".to_string(), "ACGN".to_string()]).unwrap();
+        assert!(whitelist.encoded().is_none());
+        assert!(whitelist.contains("ACGN"));
+    }
 }
@@ -1,6 +1,8 @@
 //! Count matrix generation
 
 use ahash::AHashMap;
+use flate2::write::GzEncoder;
+use flate2::Compression;
 use serde::{Deserialize, Serialize};
 use std::fs::File;
 use std::io::{BufWriter, Write};
@@ -118,57 +120,48 @@ impl CountMatrix {
         cells.iter().map(|s| s.len() as u64).collect()
     }
 
-    /// Write to Matrix Market format
+    /// Write to Matrix Market format (gzipped if `path` ends in `.gz`)
     pub fn write_mtx<P: AsRef<Path>>(&self, path: P) -> Result<()> {
-        let file = File::create(path)?;
-        let mut writer = BufWriter::new(file);
-
-        // Header
-        writeln!(writer, "%%MatrixMarket matrix coordinate integer general")?;
-        writeln!(writer, "%")?;
-        writeln!(
-            writer,
-            "{} {} {}",
-            self.n_rows,
-            self.n_cols,
-            self.values.len()
-        )?;
-
-        // Data (1-indexed)
-        for (i, ((&r, &c), &v)) in self
-            .rows
-            .iter()
-            .zip(self.cols.iter())
-            .zip(self.values.iter())
-            .enumerate()
-        {
-            if i > 0 {
-                writeln!(writer)?;
+        let path = path.as_ref();
+        write_output(path, is_gzip(path), |writer| {
+            // Header
+            writeln!(writer, "%%MatrixMarket matrix coordinate integer general")?;
+            writeln!(writer, "%")?;
+            writeln!(
+                writer,
+                "{} {} {}",
+                self.n_rows,
+                self.n_cols,
+                self.values.len()
+            )?;
+
+            // Data (1-indexed)
+            for (i, ((&r, &c), &v)) in self
+                .rows
+                .iter()
+                .zip(self.cols.iter())
+                .zip(self.values.iter())
+                .enumerate()
+            {
+                if i > 0 {
+                    writeln!(writer)?;
+                }
+                write!(writer, "{} {} {}", r + 1, c + 1, v)?;
             }
-            write!(writer, "{} {} {}", r + 1, c + 1, v)?;
-        }
-
-        Ok(())
+            Ok(())
+        })
     }
 
-    /// Write barcodes to file
+    /// Write barcodes to file (gzipped if `path` ends in `.gz`)
     pub fn write_barcodes<P: AsRef<Path>>(&self, path: P) -> Result<()> {
-        let file = File::create(path)?;
-        let mut writer = BufWriter::new(file);
-        for barcode in &self.barcodes {
-            writeln!(writer, "{}", barcode)?;
-        }
-        Ok(())
+        let path = path.as_ref();
+        write_output(path, is_gzip(path), |writer| write_barcodes(writer, &self.barcodes))
     }
 
-    /// Write genes to file
+    /// Write genes to file (gzipped if `path` ends in `.gz`)
     pub fn write_genes<P: AsRef<Path>>(&self, path: P) -> Result<()> {
-        let file = File::create(path)?;
-        let mut writer = BufWriter::new(file);
-        for gene in &self.genes {
-            writeln!(writer, "{}\t{}", gene, gene)?; // gene_id, gene_name
-        }
-        Ok(())
+        let path = path.as_ref();
+        write_output(path, is_gzip(path), |writer| write_genes(writer, &self.genes))
     }
 }
 
@@ -233,6 +226,118 @@ impl CountMatrix {
             n_cols: self.n_cols,
         }
     }
+
+    /// Convert to CSR format with cells as rows (cells x genes), as used by AnnData.
+    ///
+    /// Entries are placed with two stable counting sorts (by gene, then by cell),
+    /// so gene indices within each cell come out sorted in O(nnz) time.
+    pub fn to_cell_csr(&self) -> CsrMatrix {
+        let nnz = self.values.len();
+
+        // Order entries by gene
+        let mut gene_ptr = vec![0usize; self.n_rows + 1];
+        for &r in &self.rows {
+            gene_ptr[r + 1] += 1;
+        }
+        for i in 1..=self.n_rows {
+            gene_ptr[i] += gene_ptr[i - 1];
+        }
+        let mut by_gene = vec![0usize; nnz];
+        for (i, &r) in self.rows.iter().enumerate() {
+            by_gene[gene_ptr[r]] = i;
+            gene_ptr[r] += 1;
+        }
+
+        // Count entries per cell
+        let mut indptr = vec![0usize; self.n_cols + 1];
+        for &c in &self.cols {
+            indptr[c + 1] += 1;
+        }
+        for i in 1..=self.n_cols {
+            indptr[i] += indptr[i - 1];
+        }
+
+        // Stable fill by cell, visiting entries in gene order
+        let mut indices = vec![0usize; nnz];
+        let mut data = vec![0u32; nnz];
+        let mut current = indptr.clone();
+        for &i in &by_gene {
+            let cell = self.cols[i];
+            let pos = current[cell];
+            indices[pos] = self.rows[i];
+            data[pos] = self.values[i];
+            current[cell] += 1;
+        }
+
+        CsrMatrix {
+            indptr,
+            indices,
+            data,
+            n_rows: self.n_cols,
+            n_cols: self.n_rows,
+        }
+    }
+}
+
+/// Write buffer for matrix, barcode and gene outputs
+const OUTPUT_BUFFER_SIZE: usize = 1 << 20;
+
+/// Create `path` and fill it through an [`OUTPUT_BUFFER_SIZE`] buffer
+///
+/// With `compress`, the output is gzipped inline at the fastest level, so
+/// compression overlaps with generating the text instead of following it.
+fn write_output<F>(path: &Path, compress: bool, write: F) -> Result<()>
+where
+    F: FnOnce(&mut dyn Write) -> Result<()>,
+{
+    let file = File::create(path)?;
+    if compress {
+        let encoder = GzEncoder::new(file, Compression::fast());
+        let mut writer = BufWriter::with_capacity(OUTPUT_BUFFER_SIZE, encoder);
+        write(&mut writer)?;
+        writer.into_inner().map_err(|e| e.into_error())?.finish()?;
+    } else {
+        let mut writer = BufWriter::with_capacity(OUTPUT_BUFFER_SIZE, file);
+        write(&mut writer)?;
+        writer.flush()?;
+    }
+    Ok(())
+}
+
+/// Whether `path` names a gzip file
+fn is_gzip(path: &Path) -> bool {
+    path.extension().map_or(false, |ext| ext == "gz")
+}
+
+/// Write one barcode per line
+fn write_barcodes(writer: &mut dyn Write, barcodes: &[String]) -> Result<()> {
+    for barcode in barcodes {
+        writeln!(writer, "{}", barcode)?;
+    }
+    Ok(())
+}
+
+/// Write one `gene_id<TAB>gene_name` line per gene
+fn write_genes(writer: &mut dyn Write, genes: &[String]) -> Result<()> {
+    for gene in genes {
+        writeln!(writer, "{}\t{}", gene, gene)?;
+    }
+    Ok(())
+}
+
+/// Shape and per-cell totals of a matrix written by [`GeneCounter::stream_outputs`]
+#[derive(Debug, Clone, Default)]
+pub struct StreamedOutputs {
+    /// Number of rows (genes)
+    pub n_rows: usize,
+    /// Number of columns (cells)
+    pub n_cols: usize,
+    /// Number of non-zero entries
+    pub nnz: usize,
+    /// Genes detected per cell
+    pub genes_per_cell: Vec<u64>,
+    /// Total counts per cell
+    pub counts_per_cell: Vec<u64>,
 }
 
 /// Gene counter for building count matrix
@@ -260,23 +365,89 @@ impl GeneCounter {
         }
     }
 
-    /// Add a count for a barcode-gene pair
-    pub fn add_count(&mut self, barcode: &str, gene: &str, count: u32) {
-        let cell_idx = *self.barcode_index.entry(barcode.to_string()).or_insert_with(|| {
+    /// Get or assign the column index of a barcode
+    fn barcode_idx(&mut self, barcode: &str) -> usize {
+        *self.barcode_index.entry(barcode.to_string()).or_insert_with(|| {
             let idx = self.barcodes.len();
             self.barcodes.push(barcode.to_string());
             idx
-        });
+        })
+    }
 
-        let gene_idx = *self.gene_index.entry(gene.to_string()).or_insert_with(|| {
+    /// Get or assign the row index of a gene
+    fn gene_idx(&mut self, gene: &str) -> usize {
+        *self.gene_index.entry(gene.to_string()).or_insert_with(|| {
             let idx = self.genes.len();
             self.genes.push(gene.to_string());
             idx
-        });
+        })
+    }
 
+    /// Add a count for a barcode-gene pair
+    pub fn add_count(&mut self, barcode: &str, gene: &str, count: u32) {
+        let cell_idx = self.barcode_idx(barcode);
+        let gene_idx = self.gene_idx(gene);
         *self.counts.entry((gene_idx, cell_idx)).or_insert(0) += count;
     }
 
+    /// Add counts in bulk from COO triplets indexing into `barcodes` and `genes`
+    ///
+    /// Each barcode and gene name is interned at most once, so the per-entry
+    /// cost is a single integer-keyed map update. Panics if an index is out of
+    /// range for its name list.
+    pub fn add_counts_bulk(
+        &mut self,
+        barcodes: &[String],
+        genes: &[String],
+        cell_indices: &[usize],
+        gene_indices: &[usize],
+        counts: &[u32],
+    ) {
+        let mut cell_map = vec![usize::MAX; barcodes.len()];
+        let mut gene_map = vec![usize::MAX; genes.len()];
+
+        for ((&c, &g), &count) in cell_indices.iter().zip(gene_indices).zip(counts) {
+            if cell_map[c] == usize::MAX {
+                cell_map[c] = self.barcode_idx(&barcodes[c]);
+            }
+            if gene_map[g] == usize::MAX {
+                gene_map[g] = self.gene_idx(&genes[g]);
+            }
+            *self.counts.entry((gene_map[g], cell_map[c])).or_insert(0) += count;
+        }
+    }
+
+    /// Add counts in bulk from a cells x genes CSR matrix
+    ///
+    /// Row `i` spans `indptr[i]..indptr[i + 1]` and belongs to `barcodes[i]`;
+    /// `indices` index into `genes`. Zero counts are skipped.
+    pub fn add_csr_bulk(
+        &mut self,
+        barcodes: &[String],
+        genes: &[String],
+        indptr: &[usize],
+        indices: &[usize],
+        counts: &[u32],
+    ) {
+        let mut gene_map = vec![usize::MAX; genes.len()];
+
+        for (cell, bounds) in indptr.windows(2).enumerate() {
+            let mut cell_idx = None;
+            for k in bounds[0]..bounds[1] {
+                let count = counts[k];
+                if count == 0 {
+                    continue;
+                }
+                let c = *cell_idx.get_or_insert_with(|| self.barcode_idx(&barcodes[cell]));
+                let g = indices[k];
+                if gene_map[g] == usize::MAX {
+                    gene_map[g] = self.gene_idx(&genes[g]);
+                }
+                *self.counts.entry((gene_map[g], c)).or_insert(0) += count;
+            }
+        }
+    }
+
     /// Increment count by 1
     pub fn increment(&mut self, barcode: &str, gene: &str) {
         self.add_count(barcode, gene, 1);
@@ -314,6 +485,66 @@ impl GeneCounter {
         }
     }
 
+    /// Write `matrix.mtx`, `barcodes.tsv` and `genes.tsv` into `dir` without
+    /// building a [`CountMatrix`]
+    ///
+    /// Entries are sorted by cell, then gene, as packed `cell << 32 | gene`
+    /// keys, and streamed straight to disk. Per-cell gene and UMI totals are
+    /// gathered in the same pass and returned for QC. With `compress`, the
+    /// files are gzipped as they are written and get a `.gz` suffix.
+    pub fn stream_outputs<P: AsRef<Path>>(self, dir: P, compress: bool) -> Result<StreamedOutputs> {
+        let dir = dir.as_ref();
+        log::info!(
+            "Streaming count matrix to {}: {} genes x {} cells ({} entries)",
+            dir.display(),
+            self.genes.len(),
+            self.barcodes.len(),
+            self.counts.len()
+        );
+        let n_rows = self.genes.len();
+        let n_cols = self.barcodes.len();
+        let nnz = self.counts.len();
+        let suffix = if compress { ".gz" } else { "" };
+
+        let mut entries: Vec<(u64, u32)> = self
+            .counts
+            .into_iter()
+            .map(|((gene, cell), count)| (((cell as u64) << 32) | gene as u64, count))
+            .collect();
+        entries.sort_unstable_by_key(|&(key, _)| key);
+
+        let mut genes_per_cell = vec![0u64; n_cols];
+        let mut counts_per_cell = vec![0u64; n_cols];
+
+        write_output(&dir.join(format!("matrix.mtx{}", suffix)), compress, |writer| {
+            writeln!(writer, "%%MatrixMarket matrix coordinate integer general")?;
+            writeln!(writer, "%")?;
+            writeln!(writer, "{} {} {}", n_rows, n_cols, nnz)?;
+            for (key, count) in entries {
+                let cell = (key >> 32) as usize;
+                let gene = (key & u64::from(u32::MAX)) as usize;
+                genes_per_cell[cell] += 1;
+                counts_per_cell[cell] += u64::from(count);
+                writeln!(writer, "{} {} {}", gene + 1, cell + 1, count)?;
+            }
+            Ok(())
+        })?;
+        write_output(&dir.join(format!("barcodes.tsv{}", suffix)), compress, |writer| {
+            write_barcodes(writer, &self.barcodes)
+        })?;
+        write_output(&dir.join(format!("genes.tsv{}", suffix)), compress, |writer| {
+            write_genes(writer, &self.genes)
+        })?;
+
+        Ok(StreamedOutputs {
+            n_rows,
+            n_cols,
+            nnz,
+            genes_per_cell,
+            counts_per_cell,
+        })
+    }
+
     /// Get number of cells
     pub fn num_cells(&self) -> usize {
         self.barcodes.len()
@@ -351,6 +582,88 @@ mod tests {
         assert_eq!(matrix.values.len(), 3);
     }
 
+    #[test]
+    fn test_gene_counter_bulk() {
+        let barcodes = vec!["CELL1".to_string(), "CELL2".to_string(), "CELL3".to_string()];
+        let genes = vec!["GENE1".to_string(), "GENE2".to_string()];
+
+        let mut counter = GeneCounter::new();
+        counter.add_count("CELL2", "GENE2", 1);
+        counter.add_counts_bulk(&barcodes, &genes, &[0, 0, 1], &[0, 1, 1], &[4, 2, 3]);
+
+        // CELL3 has no entries and is not added
+        assert_eq!(counter.num_cells(), 2);
+        assert_eq!(counter.num_genes(), 2);
+
+        let matrix = counter.build();
+        let cell2 = matrix.barcodes.iter().position(|b| b == "CELL2").unwrap();
+        let gene2 = matrix.genes.iter().position(|g| g == "GENE2").unwrap();
+        assert_eq!(matrix.get(gene2, cell2), 4);
+        assert_eq!(matrix.counts_per_cell().iter().sum::<u64>(), 10);
+    }
+
+    #[test]
+    fn test_gene_counter_csr_bulk() {
+        let barcodes = vec!["CELL1".to_string(), "CELL2".to_string(), "CELL3".to_string()];
+        let genes = vec!["GENE1".to_string(), "GENE2".to_string()];
+
+        // CELL1: GENE1=4, GENE2=2; CELL2: GENE2=0 (skipped); CELL3: GENE2=3
+        let mut counter = GeneCounter::new();
+        counter.add_csr_bulk(&barcodes, &genes, &[0, 2, 3, 4], &[0, 1, 1, 1], &[4, 2, 0, 3]);
+
+        assert_eq!(counter.num_cells(), 2);
+        assert_eq!(counter.num_genes(), 2);
+
+        let matrix = counter.build();
+        let cell3 = matrix.barcodes.iter().position(|b| b == "CELL3").unwrap();
+        let gene2 = matrix.genes.iter().position(|g| g == "GENE2").unwrap();
+        assert_eq!(matrix.get(gene2, cell3), 3);
+        assert_eq!(matrix.values.len(), 3);
+    }
+
+    #[test]
+    fn test_stream_outputs() {
+        let mut counter = GeneCounter::new();
+        counter.add_count("CELL1", "GENE1", 2);
+        counter.add_count("CELL2", "GENE2", 5);
+        counter.add_count("CELL1", "GENE2", 1);
+
+        let dir = tempfile::tempdir().unwrap();
+        let out = counter.stream_outputs(dir.path(), false).unwrap();
+        assert_eq!((out.n_rows, out.n_cols, out.nnz), (2, 2, 3));
+        assert_eq!(out.genes_per_cell, vec![2, 1]);
+        assert_eq!(out.counts_per_cell, vec![3, 5]);
+
+        let mtx = std::fs::read_to_string(dir.path().join("matrix.mtx")).unwrap();
+        let lines: Vec<&str> = mtx.lines().skip(2).collect();
+        assert_eq!(lines, vec!["2 2 3", "1 1 2", "2 1 1", "2 2 5"]);
+        let barcodes = std::fs::read_to_string(dir.path().join("barcodes.tsv")).unwrap();
+        assert_eq!(barcodes, "CELL1\nCELL2\n");
+        let genes = std::fs::read_to_string(dir.path().join("genes.tsv")).unwrap();
+        assert_eq!(genes, "GENE1\tGENE1\nGENE2\tGENE2\n");
+    }
+
+    #[test]
+    fn test_stream_outputs_gzip() {
+        use flate2::read::GzDecoder;
+        use std::io::Read;
+
+        let mut counter = GeneCounter::new();
+        counter.add_count("CELL1", "GENE1", 2);
+
+        let dir = tempfile::tempdir().unwrap();
+        counter.stream_outputs(dir.path(), true).unwrap();
+        assert!(!dir.path().join("matrix.mtx").exists());
+
+        let mut mtx = String::new();
+        GzDecoder::new(File::open(dir.path().join("matrix.mtx.gz")).unwrap())
+            .read_to_string(&mut mtx)
+            .unwrap();
+        assert!(mtx.ends_with("1 1 1\n1 1 2\n"));
+        assert!(dir.path().join("barcodes.tsv.gz").exists());
+        assert!(dir.path().join("genes.tsv.gz").exists());
+    }
+
     #[test]
     fn test_count_matrix_stats() {
         let barcodes = vec!["CELL1".to_string(), "CELL2".to_string()];
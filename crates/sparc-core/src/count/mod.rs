@@ -1,5 +1,9 @@
 //! Gene counting and count matrix module
 
 mod matrix;
+mod mtx;
+mod tagged;
 
-pub use matrix::{CountMatrix, CsrMatrix, GeneCounter};
+pub use matrix::{CountMatrix, CsrMatrix, GeneCounter, StreamedOutputs};
+pub use mtx::{read_mtx_csr, MtxCsr};
+pub use tagged::{count_tagged_reads, TaggedReadStats};
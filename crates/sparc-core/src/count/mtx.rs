@@ -0,0 +1,400 @@
+//! Matrix Market reader
+
+use crate::{Error, Result};
+use flate2::read::MultiGzDecoder;
+use std::fs::File;
+use std::io::{BufRead, BufReader};
+use std::path::Path;
+
+/// Sparse matrix read from a Matrix Market file, in CSR format
+#[derive(Debug, Clone)]
+pub struct MtxCsr {
+    /// Row pointers (length n_rows + 1)
+    pub indptr: Vec<usize>,
+    /// Column indices
+    pub indices: Vec<usize>,
+    /// Non-zero values
+    pub data: Vec<f64>,
+    /// Number of rows
+    pub n_rows: usize,
+    /// Number of columns
+    pub n_cols: usize,
+    /// Whether the file declares integer (or pattern) values
+    pub integer: bool,
+}
+
+/// Value type declared in the Matrix Market header
+#[derive(Clone, Copy, PartialEq)]
+enum Field {
+    Integer,
+    Real,
+    Pattern,
+}
+
+/// Largest row or column count accepted from a header (the int32 index range)
+///
+/// Anything larger is treated as a corrupt header rather than allocated.
+const MAX_DIM: usize = i32::MAX as usize;
+
+/// Header and size line of a Matrix Market file
+struct Header {
+    field: Field,
+    n_rows: usize,
+    n_cols: usize,
+    nnz: usize,
+}
+
+/// Read a `coordinate general` Matrix Market file (optionally gzipped) into CSR
+///
+/// With `transpose`, the file's columns become rows, e.g. a 10x genes x cells
+/// matrix is returned as cells x genes. The file is streamed twice: the first
+/// pass counts entries per row, the second re-reads it and writes each entry
+/// straight into its CSR slot, so no COO copy or decompressed text is held.
+pub fn read_mtx_csr<P: AsRef<Path>>(path: P, transpose: bool) -> Result<MtxCsr> {
+    let path = path.as_ref();
+    let mut line = Vec::with_capacity(128);
+
+    // Pass 1: validate the header and count entries per output row
+    let mut reader = open_text(path)?;
+    let header = read_header(&mut reader, &mut line)?;
+    let (out_rows, out_cols) = if transpose {
+        (header.n_cols, header.n_rows)
+    } else {
+        (header.n_rows, header.n_cols)
+    };
+    let mut indptr: Vec<usize> = try_zeroed(out_rows + 1)?;
+    let mut count = 0usize;
+    for_each_entry(
+        &mut reader,
+        &mut line,
+        &header,
+        transpose,
+        false,
+        |major, _, _| {
+            indptr[major + 1] += 1;
+            count += 1;
+            Ok(())
+        },
+    )?;
+    if count != header.nnz {
+        return Err(Error::MatrixParse(format!(
+            "Expected {} entries, found {}",
+            header.nnz, count
+        )));
+    }
+    for i in 1..=out_rows {
+        indptr[i] += indptr[i - 1];
+    }
+
+    // Pass 2: re-read the entries and place them in their rows, in file order
+    let mut reader = open_text(path)?;
+    read_header(&mut reader, &mut line)?;
+    let mut indices: Vec<usize> = try_zeroed(count)?;
+    let mut data: Vec<f64> = try_zeroed(count)?;
+    let mut next: Vec<usize> = try_zeroed(out_rows)?;
+    next.copy_from_slice(&indptr[..out_rows]);
+    for_each_entry(
+        &mut reader,
+        &mut line,
+        &header,
+        transpose,
+        true,
+        |major, minor, value| {
+            let pos = next[major];
+            if pos == indptr[major + 1] {
+                return Err(Error::MatrixParse(
+                    "File changed while it was being read".to_string(),
+                ));
+            }
+            indices[pos] = minor;
+            data[pos] = value;
+            next[major] += 1;
+            Ok(())
+        },
+    )?;
+
+    Ok(MtxCsr {
+        indptr,
+        indices,
+        data,
+        n_rows: out_rows,
+        n_cols: out_cols,
+        integer: header.field != Field::Real,
+    })
+}
+
+/// Open a file for line reading, gunzipping it if it starts with the gzip magic
+fn open_text(path: &Path) -> Result<Box<dyn BufRead>> {
+    let mut reader = BufReader::with_capacity(1 << 20, File::open(path)?);
+    if reader.fill_buf()?.starts_with(&[0x1f, 0x8b]) {
+        let decoder = MultiGzDecoder::new(reader);
+        Ok(Box::new(BufReader::with_capacity(1 << 20, decoder)))
+    } else {
+        Ok(Box::new(reader))
+    }
+}
+
+/// Parse the banner and size line, leaving `reader` at the first entry
+fn read_header<R: BufRead>(reader: &mut R, line: &mut Vec<u8>) -> Result<Header> {
+    let banner = if next_line(reader, line)? {
+        String::from_utf8_lossy(line).to_lowercase()
+    } else {
+        String::new()
+    };
+    let tokens: Vec<&str> = banner.split_whitespace().collect();
+    if tokens.len() != 5 || tokens[0] != "%%matrixmarket" || tokens[1] != "matrix" {
+        return Err(Error::MatrixParse(format!(
+            "Invalid header: {:?}",
+            banner.trim()
+        )));
+    }
+    if tokens[2] != "coordinate" || tokens[4] != "general" {
+        return Err(Error::MatrixParse(format!(
+            "Unsupported format: {} {}",
+            tokens[2], tokens[4]
+        )));
+    }
+    let field = match tokens[3] {
+        "integer" => Field::Integer,
+        "real" | "double" => Field::Real,
+        "pattern" => Field::Pattern,
+        other => {
+            return Err(Error::MatrixParse(format!(
+                "Unsupported field type: {}",
+                other
+            )))
+        }
+    };
+
+    // Size line, after any comments
+    loop {
+        if !next_line(reader, line)? {
+            return Err(Error::MatrixParse("Missing size line".to_string()));
+        }
+        if !is_skipped(line) {
+            break;
+        }
+    }
+    let size = {
+        let mut tokens = tokenize(line);
+        (
+            tokens.next().and_then(parse_usize),
+            tokens.next().and_then(parse_usize),
+            tokens.next().and_then(parse_usize),
+        )
+    };
+    match size {
+        (Some(n_rows), Some(n_cols), Some(nnz)) if n_rows <= MAX_DIM && n_cols <= MAX_DIM => {
+            Ok(Header {
+                field,
+                n_rows,
+                n_cols,
+                nnz,
+            })
+        }
+        _ => Err(Error::MatrixParse(format!(
+            "Invalid size line: {:?}",
+            String::from_utf8_lossy(line)
+        ))),
+    }
+}
+
+/// Call `f(major, minor, value)` for each remaining entry of the file
+///
+/// Values are only parsed when `values` is set; otherwise `f` gets 0.0.
+fn for_each_entry<R, F>(
+    reader: &mut R,
+    line: &mut Vec<u8>,
+    header: &Header,
+    transpose: bool,
+    values: bool,
+    mut f: F,
+) -> Result<()>
+where
+    R: BufRead,
+    F: FnMut(usize, usize, f64) -> Result<()>,
+{
+    while next_line(reader, line)? {
+        if is_skipped(line) {
+            continue;
+        }
+        let mut tokens = tokenize(line);
+        let row = tokens.next().and_then(parse_usize).unwrap_or(0);
+        let col = tokens.next().and_then(parse_usize).unwrap_or(0);
+        if row == 0 || row > header.n_rows || col == 0 || col > header.n_cols {
+            return Err(Error::MatrixParse(format!(
+                "Invalid entry: {:?}",
+                String::from_utf8_lossy(line)
+            )));
+        }
+        let value = match (values, header.field) {
+            (false, _) => 0.0,
+            (true, Field::Pattern) => 1.0,
+            (true, field) => {
+                let token = tokens.next().and_then(|t| std::str::from_utf8(t).ok());
+                let parsed = token.and_then(|t| {
+                    if field == Field::Integer {
+                        t.parse::<i64>().ok().map(|v| v as f64)
+                    } else {
+                        t.parse::<f64>().ok()
+                    }
+                });
+                parsed.ok_or_else(|| {
+                    Error::MatrixParse(format!(
+                        "Invalid value in entry: {:?}",
+                        String::from_utf8_lossy(line)
+                    ))
+                })?
+            }
+        };
+        if transpose {
+            f(col - 1, row - 1, value)?;
+        } else {
+            f(row - 1, col - 1, value)?;
+        }
+    }
+    Ok(())
+}
+
+/// Allocate `len` zeroed elements, returning an error instead of aborting
+/// when a (possibly corrupt) header asks for more memory than is available
+fn try_zeroed<T: Clone + Default>(len: usize) -> Result<Vec<T>> {
+    let mut v = Vec::new();
+    v.try_reserve_exact(len).map_err(|_| {
+        Error::MatrixParse(format!("Matrix too large to allocate ({} entries)", len))
+    })?;
+    v.resize(len, T::default());
+    Ok(v)
+}
+
+/// Read the next line into `line` (without the newline); false at end of input
+fn next_line<R: BufRead>(reader: &mut R, line: &mut Vec<u8>) -> Result<bool> {
+    line.clear();
+    if reader.read_until(b'\n', line)? == 0 {
+        return Ok(false);
+    }
+    if line.last() == Some(&b'\n') {
+        line.pop();
+    }
+    Ok(true)
+}
+
+/// Blank and comment lines carry no entries
+fn is_skipped(line: &[u8]) -> bool {
+    line.iter()
+        .find(|b| !b.is_ascii_whitespace())
+        .map_or(true, |&b| b == b'%')
+}
+
+fn tokenize(line: &[u8]) -> impl Iterator<Item = &[u8]> {
+    line.split(|b| b.is_ascii_whitespace())
+        .filter(|t| !t.is_empty())
+}
+
+fn parse_usize(token: &[u8]) -> Option<usize> {
+    if token.is_empty() || token.len() > 19 {
+        return None;
+    }
+    token.iter().try_fold(0usize, |acc, &b| {
+        b.is_ascii_digit().then(|| acc * 10 + (b - b'0') as usize)
+    })
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use flate2::write::GzEncoder;
+    use flate2::Compression;
+    use std::io::Write;
+
+    const MTX: &str = "%%MatrixMarket matrix coordinate integer general\n\
+                       % comment\n\
+                       3 2 4\n\
+                       1 1 5\n\
+                       3 1 2\n\
+                       2 2 7\r\n\
+                       1 2 1\n";
+
+    #[test]
+    fn test_read_mtx_csr() {
+        let dir = tempfile::tempdir().unwrap();
+        let path = dir.path().join("matrix.mtx");
+        std::fs::write(&path, MTX).unwrap();
+
+        let csr = read_mtx_csr(&path, false).unwrap();
+        assert_eq!((csr.n_rows, csr.n_cols), (3, 2));
+        assert_eq!(csr.indptr, vec![0, 2, 3, 4]);
+        assert_eq!(csr.indices, vec![0, 1, 1, 0]);
+        assert_eq!(csr.data, vec![5.0, 1.0, 7.0, 2.0]);
+        assert!(csr.integer);
+
+        let csr = read_mtx_csr(&path, true).unwrap();
+        assert_eq!((csr.n_rows, csr.n_cols), (2, 3));
+        assert_eq!(csr.indptr, vec![0, 2, 4]);
+        assert_eq!(csr.indices, vec![0, 2, 1, 0]);
+        assert_eq!(csr.data, vec![5.0, 2.0, 7.0, 1.0]);
+    }
+
+    #[test]
+    fn test_read_mtx_csr_gzip() {
+        let dir = tempfile::tempdir().unwrap();
+        let path = dir.path().join("matrix.mtx.gz");
+        let mut encoder = GzEncoder::new(File::create(&path).unwrap(), Compression::fast());
+        encoder.write_all(MTX.as_bytes()).unwrap();
+        encoder.finish().unwrap();
+
+        let csr = read_mtx_csr(&path, true).unwrap();
+        assert_eq!(csr.indptr, vec![0, 2, 4]);
+        assert_eq!(csr.data, vec![5.0, 2.0, 7.0, 1.0]);
+    }
+
+    #[test]
+    fn test_read_mtx_csr_invalid() {
+        let dir = tempfile::tempdir().unwrap();
+        let path = dir.path().join("matrix.mtx");
+
+        std::fs::write(&path, "%%MatrixMarket matrix array real general\n2 2\n").unwrap();
+        assert!(matches!(
+            read_mtx_csr(&path, false),
+            Err(Error::MatrixParse(_))
+        ));
+
+        std::fs::write(
+            &path,
+            "%%MatrixMarket matrix coordinate integer general\n2 2 2\n1 1 1\n3 1 1\n",
+        )
+        .unwrap();
+        assert!(matches!(
+            read_mtx_csr(&path, false),
+            Err(Error::MatrixParse(_))
+        ));
+    }
+
+    #[test]
+    fn test_read_mtx_csr_corrupt_size() {
+        let dir = tempfile::tempdir().unwrap();
+        let path = dir.path().join("matrix.mtx");
+
+        // Dimensions beyond MAX_DIM are rejected before anything is allocated
+        std::fs::write(
+            &path,
+            "%%MatrixMarket matrix coordinate integer general\n99999999999999 2 1\n1 1 1\n",
+        )
+        .unwrap();
+        assert!(matches!(
+            read_mtx_csr(&path, false),
+            Err(Error::MatrixParse(_))
+        ));
+
+        // A huge entry count is checked against the entries actually present
+        std::fs::write(
+            &path,
+            "%%MatrixMarket matrix coordinate integer general\n2 2 999999999999999\n1 1 1\n",
+        )
+        .unwrap();
+        assert!(matches!(
+            read_mtx_csr(&path, false),
+            Err(Error::MatrixParse(_))
+        ));
+    }
+}
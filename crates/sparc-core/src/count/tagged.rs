@@ -0,0 +1,210 @@
+//! Counting from reads whose ids carry a gene tag
+
+use super::GeneCounter;
+use crate::barcode::{encode_barcode, BarcodeCorrector};
+use crate::fastq::FastqRecord;
+use crate::{ReadStructure, Result};
+use ahash::{AHashMap, AHashSet};
+
+/// Read tallies from [`count_tagged_reads`]
+#[derive(Debug, Clone, Default, PartialEq, Eq)]
+pub struct TaggedReadStats {
+    pub total_reads: u64,
+    pub valid_barcodes: u64,
+    pub corrected_barcodes: u64,
+    pub invalid_barcodes: u64,
+}
+
+/// Count unique UMIs per (barcode, gene) into `counter`
+///
+/// The gene is the last `:`-separated field of the read id (e.g.
+/// `READ_00000001:BARCODE:GENE`); reads without one, or tagged `NONE`, are
+/// tallied but not counted. Without a `corrector`, every barcode is accepted
+/// as-is. Pairs are added to `counter` cell by cell in first-seen order.
+pub fn count_tagged_reads<I>(
+    records: I,
+    corrector: Option<&BarcodeCorrector>,
+    rs: &ReadStructure,
+    counter: &mut GeneCounter,
+) -> Result<TaggedReadStats>
+where
+    I: IntoIterator<Item = Result<FastqRecord>>,
+{
+    let mut stats = TaggedReadStats::default();
+    let min_len = rs.barcode_start + rs.barcode_len + rs.umi_len;
+
+    // Barcodes all have the read structure's length, so packed codes are unique;
+    // only barcodes that cannot be packed (e.g. with an N) are hashed as strings
+    let mut packed_index: AHashMap<u64, u32> = AHashMap::new();
+    let mut barcode_index: AHashMap<String, u32> = AHashMap::new();
+    let mut barcodes: Vec<String> = Vec::new();
+    let mut gene_index: AHashMap<String, u32> = AHashMap::new();
+    let mut genes: Vec<String> = Vec::new();
+    // (cell, gene) -> position in `pairs`, which holds each pair's UMI set
+    let mut pair_index: AHashMap<(u32, u32), usize> = AHashMap::new();
+    let mut pairs: Vec<(u32, u32, AHashSet<Vec<u8>>)> = Vec::new();
+    // Reused across reads so matching does not allocate
+    let mut barcode_buf: Vec<u8> = Vec::new();
+
+    for record in records {
+        let record = record?;
+        stats.total_reads += 1;
+
+        if record.seq.len() < min_len {
+            continue;
+        }
+        let (Some(barcode), Some(umi)) = (
+            record.subsequence(rs.barcode_start, rs.barcode_len),
+            record.subsequence(rs.umi_start, rs.umi_len),
+        ) else {
+            continue;
+        };
+
+        barcode_buf.clear();
+        match corrector {
+            Some(corrector) => match corrector.match_bytes(barcode, &mut barcode_buf) {
+                Some(dist) => {
+                    stats.valid_barcodes += 1;
+                    if dist > 0 {
+                        stats.corrected_barcodes += 1;
+                    }
+                }
+                None => {
+                    stats.invalid_barcodes += 1;
+                    continue;
+                }
+            },
+            None => {
+                stats.valid_barcodes += 1;
+                barcode_buf.extend_from_slice(barcode);
+            }
+        }
+        if barcode_buf.is_empty() {
+            continue;
+        }
+        let Some(gene) = gene_from_read_id(&record.id) else {
+            continue;
+        };
+
+        let cell = match encode_barcode(&barcode_buf) {
+            Some(code) => *packed_index.entry(code).or_insert_with(|| {
+                barcodes.push(String::from_utf8_lossy(&barcode_buf).into_owned());
+                barcodes.len() as u32 - 1
+            }),
+            None => intern(
+                &mut barcode_index,
+                &mut barcodes,
+                &String::from_utf8_lossy(&barcode_buf),
+            ),
+        };
+        let gene = intern(&mut gene_index, &mut genes, gene);
+        let pos = *pair_index.entry((cell, gene)).or_insert_with(|| {
+            pairs.push((cell, gene, AHashSet::new()));
+            pairs.len() - 1
+        });
+        let umis = &mut pairs[pos].2;
+        if !umis.contains(umi) {
+            umis.insert(umi.to_vec());
+        }
+    }
+
+    // Group by cell (stable, so genes keep their per-cell first-seen order)
+    pairs.sort_by_key(|&(cell, _, _)| cell);
+    for (cell, gene, umis) in &pairs {
+        counter.add_count(
+            &barcodes[*cell as usize],
+            &genes[*gene as usize],
+            umis.len() as u32,
+        );
+    }
+
+    Ok(stats)
+}
+
+/// Look up or assign the index of `name`
+fn intern(index: &mut AHashMap<String, u32>, names: &mut Vec<String>, name: &str) -> u32 {
+    if let Some(&idx) = index.get(name) {
+        return idx;
+    }
+    let idx = names.len() as u32;
+    index.insert(name.to_string(), idx);
+    names.push(name.to_string());
+    idx
+}
+
+/// Gene tag of a read id such as `READ_00000001:BARCODE:GENE`
+fn gene_from_read_id(id: &str) -> Option<&str> {
+    let mut fields = id.split(':');
+    let gene = fields.next_back()?.trim();
+    // At least three fields, and a real gene name
+    if fields.count() < 2 || gene.is_empty() || gene == "NONE" {
+        return None;
+    }
+    Some(gene)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::barcode::Whitelist;
+
+    fn read(id: &str, seq: &str) -> Result<FastqRecord> {
+        Ok(FastqRecord::new(
+            id.to_string(),
+            seq.as_bytes().to_vec(),
+            vec![b'I'; seq.len()],
+        ))
+    }
+
+    #[test]
+    fn test_gene_from_read_id() {
+        assert_eq!(gene_from_read_id("R1:AAAA:GAPDH"), Some("GAPDH"));
+        assert_eq!(gene_from_read_id("R1:x:AAAA: ACTB "), Some("ACTB"));
+        assert_eq!(gene_from_read_id("R1:AAAA:NONE"), None);
+        assert_eq!(gene_from_read_id("R1:GAPDH"), None);
+        assert_eq!(gene_from_read_id("R1:AAAA:"), None);
+    }
+
+    #[test]
+    fn test_count_tagged_reads() {
+        let whitelist =
+            Whitelist::from_vec(vec!["AAAA".to_string(), "CCCC".to_string()]).unwrap();
+        let corrector = BarcodeCorrector::new(whitelist, 1);
+        let rs = ReadStructure::new(0, 4, 4, 2, 0);
+        let reads = vec![
+            read("r1:x:G1", "AAAAGG"),
+            read("r2:x:G1", "AAAAGG"), // duplicate UMI
+            read("r3:x:G1", "AAATTT"), // corrected, new UMI
+            read("r4:x:G2", "CCCCGG"),
+            read("r5:x:G3", "AAAAGG"),
+            read("r6:x:G1", "GGGGGG"), // no match
+            read("r7:x:NONE", "CCCCGG"),
+            read("r8:x:G1", "AAA"), // too short
+        ];
+
+        let mut counter = GeneCounter::new();
+        let stats = count_tagged_reads(reads, Some(&corrector), &rs, &mut counter).unwrap();
+        assert_eq!(
+            stats,
+            TaggedReadStats {
+                total_reads: 8,
+                valid_barcodes: 6,
+                corrected_barcodes: 1,
+                invalid_barcodes: 1,
+            }
+        );
+
+        let matrix = counter.build();
+        assert_eq!(matrix.barcodes, vec!["AAAA", "CCCC"]);
+        assert_eq!(matrix.genes, vec!["G1", "G3", "G2"]);
+        let mut entries: Vec<_> = matrix
+            .rows
+            .iter()
+            .zip(&matrix.cols)
+            .zip(&matrix.values)
+            .map(|((&r, &c), &v)| (r, c, v))
+            .collect();
+        entries.sort();
+        assert_eq!(entries, vec![(0, 0, 2), (1, 0, 1), (2, 1, 1)]);
+    }
+}
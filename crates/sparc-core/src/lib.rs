@@ -52,6 +52,9 @@ pub enum Error {
 
     #[error("Invalid read structure: {0}")]
     ReadStructure(String),
+
+    #[error("Matrix Market parsing error: {0}")]
+    MatrixParse(String),
 }
 
 pub type Result<T> = std::result::Result<T, Error>;
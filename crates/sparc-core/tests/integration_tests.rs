@@ -270,6 +270,23 @@ fn test_count_matrix_to_csr() {
     assert_eq!(csr.indptr.len(), 3); // n_rows + 1
 }
 
+#[test]
+fn test_count_matrix_to_cell_csr() {
+    let barcodes = vec!["C1".to_string(), "C2".to_string(), "C3".to_string()];
+    let genes = vec!["G1".to_string(), "G2".to_string()];
+    // genes x cells
+    let data = vec![vec![10, 0, 4], vec![3, 8, 0]];
+
+    let matrix = CountMatrix::from_dense(barcodes, genes, data);
+    let csr = matrix.to_cell_csr();
+
+    assert_eq!(csr.n_rows, 3);
+    assert_eq!(csr.n_cols, 2);
+    assert_eq!(csr.indptr, vec![0, 2, 3, 4]);
+    assert_eq!(csr.indices, vec![0, 1, 1, 0]);
+    assert_eq!(csr.data, vec![10, 3, 8, 4]);
+}
+
 #[test]
 fn test_count_matrix_empty() {
     let matrix = CountMatrix::new();
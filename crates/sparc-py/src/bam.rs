@@ -102,9 +102,11 @@ pub struct PyBamParser {
 
 #[pymethods]
 impl PyBamParser {
+    /// Open a BAM file, skipping records with mapping quality below `min_mapq`
     #[new]
-    fn new(path: &str) -> PyResult<Self> {
-        let inner = BamParser::open(path)
+    #[pyo3(signature = (path, min_mapq = 0))]
+    fn new(path: &str, min_mapq: u8) -> PyResult<Self> {
+        let inner = BamParser::with_min_mapq(path, min_mapq)
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?;
         Ok(Self { inner })
     }
@@ -135,6 +137,16 @@ impl PyBamParser {
         Ok(records.into_iter().map(|r| PyBamRecord { inner: r }).collect())
     }
 
+    /// Read up to `chunk_size` records into a list; empty at end of file
+    #[pyo3(signature = (chunk_size = 4096))]
+    fn next_batch(&mut self, chunk_size: usize) -> PyResult<Vec<PyBamRecord>> {
+        let records = self
+            .inner
+            .next_batch(chunk_size)
+            .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?;
+        Ok(records.into_iter().map(|r| PyBamRecord { inner: r }).collect())
+    }
+
     /// Filter records by mapping quality
     fn filter_by_mapq(&mut self, min_mapq: u8) -> PyResult<Vec<PyBamRecord>> {
         let records = self
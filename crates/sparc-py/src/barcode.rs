@@ -1,7 +1,10 @@
 //! Barcode Python bindings
 
+use numpy::{PyArray1, PyArray2};
 use pyo3::prelude::*;
-use sparc_core::barcode::{BarcodeCorrector, BarcodeMatch, Whitelist};
+use sparc_core::barcode::{extract_barcodes_parallel, BarcodeCorrector, BarcodeMatch, Whitelist};
+use sparc_core::fastq::FastqParser;
+use sparc_core::ReadStructure;
 
 /// Python wrapper for Whitelist
 #[pyclass(name = "Whitelist")]
@@ -55,7 +58,7 @@ impl PyWhitelist {
 /// Python wrapper for BarcodeCorrector
 #[pyclass(name = "BarcodeCorrector")]
 pub struct PyBarcodeCorrector {
-    inner: BarcodeCorrector,
+    pub(crate) inner: BarcodeCorrector,
 }
 
 #[pymethods]
@@ -77,6 +80,29 @@ impl PyBarcodeCorrector {
         }
     }
 
+    /// Match a barcode given as bytes, without decoding it to str first
+    ///
+    /// Returns the same (status, corrected_barcode, distance) as `match_barcode`.
+    fn match_barcode_bytes(&self, barcode: &[u8]) -> (String, Option<String>, u32) {
+        let mut corrected = Vec::with_capacity(barcode.len());
+        match self.inner.match_bytes(barcode, &mut corrected) {
+            Some(dist) => {
+                let status = if dist == 0 { "exact" } else { "corrected" };
+                let corrected = String::from_utf8_lossy(&corrected).into_owned();
+                (status.to_string(), Some(corrected), dist)
+            }
+            None => ("no_match".to_string(), None, 0),
+        }
+    }
+
+    /// Match a 2-bit packed barcode (A=0, C=1, G=2, T=3, first base most significant)
+    ///
+    /// Returns (packed_whitelist_barcode, distance), or None if there is no
+    /// unambiguous match or the whitelist cannot be packed.
+    fn match_encoded(&self, code: u64) -> Option<(u64, u32)> {
+        self.inner.match_encoded(code)
+    }
+
     /// Check if barcode is valid (exact or correctable)
     fn is_valid(&self, barcode: &str) -> bool {
         self.inner.match_barcode(barcode).is_valid()
@@ -95,3 +121,39 @@ impl PyBarcodeCorrector {
             .collect()
     }
 }
+
+/// Extract and correct barcodes/UMIs from an R1 FASTQ file in a single pass.
+///
+/// Returns (total_reads, valid_barcodes, corrected_barcodes, barcodes, umis), where
+/// barcodes and umis are uint8 arrays of shape (n_valid, barcode_len) and (n_valid, umi_len).
+/// Reads are corrected on `threads` worker threads (0 = one per core) with the GIL released.
+#[pyfunction]
+#[pyo3(signature = (r1_path, corrector, barcode_start = 0, barcode_len = 16, umi_start = 16, umi_len = 12, min_quality = 10.0, threads = 0))]
+pub fn extract_barcodes_bulk<'py>(
+    py: Python<'py>,
+    r1_path: &str,
+    corrector: &PyBarcodeCorrector,
+    barcode_start: usize,
+    barcode_len: usize,
+    umi_start: usize,
+    umi_len: usize,
+    min_quality: f64,
+    threads: usize,
+) -> PyResult<(u64, u64, u64, &'py PyArray2<u8>, &'py PyArray2<u8>)> {
+    let read_structure = ReadStructure::new(barcode_start, barcode_len, umi_start, umi_len, 0);
+    let corrector = &corrector.inner;
+
+    // Parsing and correction run without the GIL
+    let out = py
+        .allow_threads(|| {
+            let parser = FastqParser::open(r1_path)?;
+            extract_barcodes_parallel(parser, corrector, &read_structure, min_quality, threads)
+        })
+        .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?;
+
+    let n = out.valid_barcodes as usize;
+    let barcodes = PyArray1::from_vec(py, out.barcodes).reshape((n, barcode_len))?;
+    let umis = PyArray1::from_vec(py, out.umis).reshape((n, umi_len))?;
+
+    Ok((out.total_reads, out.valid_barcodes, out.corrected_barcodes, barcodes, umis))
+}
@@ -1,6 +1,7 @@
 //! FASTQ Python bindings
 
 use pyo3::prelude::*;
+use pyo3::types::PyBytes;
 use sparc_core::fastq::{FastqParser, FastqRecord, FastqWriter};
 
 /// Python wrapper for FastqRecord
@@ -70,9 +71,11 @@ pub struct PyFastqParser {
 
 #[pymethods]
 impl PyFastqParser {
+    /// Open a FASTQ file, reading it in `buffer_size_kb`-KiB chunks
     #[new]
-    fn new(path: &str) -> PyResult<Self> {
-        let inner = FastqParser::open(path)
+    #[pyo3(signature = (path, buffer_size_kb = 256))]
+    fn new(path: &str, buffer_size_kb: usize) -> PyResult<Self> {
+        let inner = FastqParser::open_with_buffer(path, buffer_size_kb * 1024)
             .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?;
         Ok(Self { inner })
     }
@@ -89,6 +92,52 @@ impl PyFastqParser {
         }
     }
 
+    /// Read up to `batch_size` records into one FastqBatch; empty at end of file
+    #[pyo3(signature = (batch_size = 4096))]
+    fn next_batch(&mut self, py: Python<'_>, batch_size: usize) -> PyResult<PyFastqBatch> {
+        let mut records = Vec::with_capacity(batch_size);
+        while records.len() < batch_size {
+            match self.inner.next() {
+                Some(result) => records.push(
+                    result
+                        .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?,
+                ),
+                None => break,
+            }
+        }
+
+        // Lay the fields out back to back, then copy each one straight into
+        // the bytes object
+        let mut offsets = Vec::with_capacity(records.len());
+        let mut len = 0;
+        for record in &records {
+            let mut span = |n: usize| {
+                let start = len;
+                len += n;
+                (start, len)
+            };
+            offsets.push([
+                span(record.id.len()),
+                span(record.seq.len()),
+                span(record.qual.len()),
+            ]);
+        }
+        let buf = PyBytes::new_with(py, len, |buf| {
+            for (record, spans) in records.iter().zip(&offsets) {
+                let fields = [record.id.as_bytes(), &record.seq, &record.qual];
+                for (&(start, end), field) in spans.iter().zip(fields) {
+                    buf[start..end].copy_from_slice(field);
+                }
+            }
+            Ok(())
+        })?;
+
+        Ok(PyFastqBatch {
+            buf: buf.into(),
+            offsets,
+        })
+    }
+
     /// Read all records into a list
     fn read_all(&mut self) -> PyResult<Vec<PyFastqRecord>> {
         let mut records = Vec::new();
@@ -101,6 +150,80 @@ impl PyFastqParser {
     }
 }
 
+/// A batch of FASTQ records stored in one contiguous bytes buffer
+///
+/// Records are views into the buffer, given by (start, end) offsets of their
+/// id, sequence and quality; no per-record Python objects are created unless
+/// a record is accessed.
+#[pyclass(name = "FastqBatch")]
+pub struct PyFastqBatch {
+    buf: Py<PyBytes>,
+    /// (start, end) offsets of id, seq and qual for each record
+    offsets: Vec<[(usize, usize); 3]>,
+}
+
+impl PyFastqBatch {
+    /// Resolve a (possibly negative) record index
+    fn index(&self, i: isize) -> PyResult<usize> {
+        let n = self.offsets.len() as isize;
+        let idx = if i < 0 { i + n } else { i };
+        if idx < 0 || idx >= n {
+            return Err(PyErr::new::<pyo3::exceptions::PyIndexError, _>(
+                "FastqBatch index out of range",
+            ));
+        }
+        Ok(idx as usize)
+    }
+
+    /// Slice field `field` (0 = id, 1 = seq, 2 = qual) of record `i`
+    fn field<'py>(&self, py: Python<'py>, i: isize, field: usize) -> PyResult<&'py [u8]> {
+        let (start, end) = self.offsets[self.index(i)?][field];
+        Ok(&self.buf.as_ref(py).as_bytes()[start..end])
+    }
+}
+
+#[pymethods]
+impl PyFastqBatch {
+    fn __len__(&self) -> usize {
+        self.offsets.len()
+    }
+
+    /// Get record `i` as a FastqRecord
+    fn __getitem__(&self, py: Python<'_>, i: isize) -> PyResult<PyFastqRecord> {
+        let id = String::from_utf8_lossy(self.field(py, i, 0)?).into_owned();
+        let seq = self.field(py, i, 1)?.to_vec();
+        let qual = self.field(py, i, 2)?.to_vec();
+        Ok(PyFastqRecord {
+            inner: FastqRecord::new(id, seq, qual),
+        })
+    }
+
+    /// Get the read id of record `i`
+    fn id(&self, py: Python<'_>, i: isize) -> PyResult<String> {
+        Ok(String::from_utf8_lossy(self.field(py, i, 0)?).into_owned())
+    }
+
+    /// Get the sequence of record `i`
+    fn seq<'py>(&self, py: Python<'py>, i: isize) -> PyResult<&'py [u8]> {
+        self.field(py, i, 1)
+    }
+
+    /// Get the quality string of record `i`
+    fn qual<'py>(&self, py: Python<'py>, i: isize) -> PyResult<&'py [u8]> {
+        self.field(py, i, 2)
+    }
+
+    /// Get the underlying bytes buffer holding every record
+    #[getter]
+    fn buffer(&self, py: Python<'_>) -> Py<PyBytes> {
+        self.buf.clone_ref(py)
+    }
+
+    fn __repr__(&self) -> String {
+        format!("FastqBatch(records={})", self.offsets.len())
+    }
+}
+
 /// Python wrapper for FastqWriter
 #[pyclass(name = "FastqWriter", unsendable)]
 pub struct PyFastqWriter {
@@ -16,6 +16,7 @@ fn sparc_py(_py: Python<'_>, m: &PyModule) -> PyResult<()> {
     // Core I/O classes
     m.add_class::<fastq::PyFastqParser>()?;
     m.add_class::<fastq::PyFastqRecord>()?;
+    m.add_class::<fastq::PyFastqBatch>()?;
     m.add_class::<fastq::PyFastqWriter>()?;
     m.add_class::<bam::PyBamParser>()?;
     m.add_class::<bam::PyBamRecord>()?;
@@ -23,10 +24,13 @@ fn sparc_py(_py: Python<'_>, m: &PyModule) -> PyResult<()> {
     // Barcode classes
     m.add_class::<barcode::PyWhitelist>()?;
     m.add_class::<barcode::PyBarcodeCorrector>()?;
+    m.add_function(wrap_pyfunction!(barcode::extract_barcodes_bulk, m)?)?;
 
     // Count matrix classes
     m.add_class::<matrix::PyCountMatrix>()?;
     m.add_class::<matrix::PyGeneCounter>()?;
+    m.add_function(wrap_pyfunction!(matrix::read_mtx_csr, m)?)?;
+    m.add_function(wrap_pyfunction!(matrix::count_tagged_reads, m)?)?;
 
     // QC classes
     m.add_class::<qc::PyQcMetrics>()?;
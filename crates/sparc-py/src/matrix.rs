@@ -1,8 +1,13 @@
 //! Count matrix Python bindings
 
-use numpy::{PyArray1, PyArray2, ToPyArray};
+use numpy::{IntoPyArray, PyArray1, PyArray2, PyReadonlyArray1, ToPyArray};
 use pyo3::prelude::*;
-use sparc_core::count::{CountMatrix, GeneCounter};
+use crate::barcode::PyBarcodeCorrector;
+use sparc_core::count::{
+    count_tagged_reads as count_tagged, read_mtx_csr as read_mtx, CountMatrix, GeneCounter,
+};
+use sparc_core::fastq::FastqParser;
+use sparc_core::{Error, ReadStructure};
 
 /// Python wrapper for CountMatrix
 #[pyclass(name = "CountMatrix")]
@@ -71,24 +76,36 @@ impl PyCountMatrix {
         self.inner.values.to_pyarray(py)
     }
 
+    /// Get (indptr, indices, data) of the cells x genes CSR matrix as numpy arrays
+    fn to_csr_arrays<'py>(
+        &self,
+        py: Python<'py>,
+    ) -> (&'py PyArray1<i64>, &'py PyArray1<i64>, &'py PyArray1<f32>) {
+        let csr = self.inner.to_cell_csr();
+        let indptr: Vec<i64> = csr.indptr.iter().map(|&p| p as i64).collect();
+        let indices: Vec<i64> = csr.indices.iter().map(|&i| i as i64).collect();
+        let data: Vec<f32> = csr.data.iter().map(|&v| v as f32).collect();
+        (indptr.into_pyarray(py), indices.into_pyarray(py), data.into_pyarray(py))
+    }
+
     /// Get total counts per cell as numpy array
     fn counts_per_cell<'py>(&self, py: Python<'py>) -> &'py PyArray1<u64> {
-        self.inner.counts_per_cell().to_pyarray(py)
+        self.inner.counts_per_cell().into_pyarray(py)
     }
 
     /// Get total counts per gene as numpy array
     fn counts_per_gene<'py>(&self, py: Python<'py>) -> &'py PyArray1<u64> {
-        self.inner.counts_per_gene().to_pyarray(py)
+        self.inner.counts_per_gene().into_pyarray(py)
     }
 
     /// Get number of genes detected per cell
     fn genes_per_cell<'py>(&self, py: Python<'py>) -> &'py PyArray1<u64> {
-        self.inner.genes_per_cell().to_pyarray(py)
+        self.inner.genes_per_cell().into_pyarray(py)
     }
 
     /// Get number of cells expressing each gene
     fn cells_per_gene<'py>(&self, py: Python<'py>) -> &'py PyArray1<u64> {
-        self.inner.cells_per_gene().to_pyarray(py)
+        self.inner.cells_per_gene().into_pyarray(py)
     }
 
     /// Convert to dense numpy array (for small matrices)
@@ -110,7 +127,7 @@ impl PyCountMatrix {
             .expect("reshape dimensions match n_rows * n_cols")
     }
 
-    /// Write to Matrix Market format
+    /// Write to Matrix Market format (gzipped if the path ends in .gz)
     fn write_mtx(&self, path: &str) -> PyResult<()> {
         self.inner
             .write_mtx(path)
@@ -161,6 +178,105 @@ impl PyGeneCounter {
         self.inner.add_count(barcode, gene, count);
     }
 
+    /// Add counts in bulk from COO arrays
+    ///
+    /// `rows` index into `barcodes` (cells), `cols` index into `genes`.
+    fn add_counts_bulk(
+        &mut self,
+        rows: PyReadonlyArray1<'_, i64>,
+        cols: PyReadonlyArray1<'_, i64>,
+        values: PyReadonlyArray1<'_, u32>,
+        barcodes: Vec<String>,
+        genes: Vec<String>,
+    ) -> PyResult<()> {
+        let rows = rows.as_slice()?;
+        let cols = cols.as_slice()?;
+        let values = values.as_slice()?;
+        if rows.len() != cols.len() || rows.len() != values.len() {
+            return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                "rows, cols and values must have the same length",
+            ));
+        }
+
+        let to_index = |idx: &[i64], bound: usize, name: &str| -> PyResult<Vec<usize>> {
+            idx.iter()
+                .map(|&i| {
+                    usize::try_from(i).ok().filter(|&i| i < bound).ok_or_else(|| {
+                        PyErr::new::<pyo3::exceptions::PyIndexError, _>(format!(
+                            "{} index {} out of range for {} entries",
+                            name, i, bound
+                        ))
+                    })
+                })
+                .collect()
+        };
+        let cell_indices = to_index(rows, barcodes.len(), "barcode")?;
+        let gene_indices = to_index(cols, genes.len(), "gene")?;
+
+        self.inner
+            .add_counts_bulk(&barcodes, &genes, &cell_indices, &gene_indices, values);
+        Ok(())
+    }
+
+    /// Add counts in bulk from a cells x genes CSR matrix
+    ///
+    /// Row `i` of (`indptr`, `indices`, `values`) belongs to `barcodes[i]`;
+    /// `indices` index into `genes`. Zero values are skipped.
+    fn add_csr_bulk(
+        &mut self,
+        indptr: PyReadonlyArray1<'_, i64>,
+        indices: PyReadonlyArray1<'_, i64>,
+        values: PyReadonlyArray1<'_, u32>,
+        barcodes: Vec<String>,
+        genes: Vec<String>,
+    ) -> PyResult<()> {
+        let indptr = indptr.as_slice()?;
+        let indices = indices.as_slice()?;
+        let values = values.as_slice()?;
+        if indptr.len() != barcodes.len() + 1 {
+            return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(format!(
+                "indptr must have {} entries (one per barcode plus one), got {}",
+                barcodes.len() + 1,
+                indptr.len()
+            )));
+        }
+        if indices.len() != values.len() {
+            return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                "indices and values must have the same length",
+            ));
+        }
+
+        let indptr: Vec<usize> = indptr
+            .iter()
+            .map(|&p| usize::try_from(p).unwrap_or(usize::MAX))
+            .collect();
+        let valid_indptr = indptr[0] == 0
+            && indptr.windows(2).all(|w| w[0] <= w[1])
+            && indptr[indptr.len() - 1] <= indices.len();
+        if !valid_indptr {
+            return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                "indptr must be non-decreasing, start at 0 and end within indices",
+            ));
+        }
+
+        let n_genes = genes.len();
+        let gene_indices = indices
+            .iter()
+            .map(|&i| {
+                usize::try_from(i).ok().filter(|&i| i < n_genes).ok_or_else(|| {
+                    PyErr::new::<pyo3::exceptions::PyIndexError, _>(format!(
+                        "gene index {} out of range for {} entries",
+                        i, n_genes
+                    ))
+                })
+            })
+            .collect::<PyResult<Vec<usize>>>()?;
+
+        self.inner
+            .add_csr_bulk(&barcodes, &genes, &indptr, &gene_indices, values);
+        Ok(())
+    }
+
     /// Increment count by 1
     fn increment(&mut self, barcode: &str, gene: &str) {
         self.inner.increment(barcode, gene);
@@ -184,6 +300,31 @@ impl PyGeneCounter {
         }
     }
 
+    /// Write matrix.mtx, barcodes.tsv and genes.tsv into `output_dir` in one pass
+    ///
+    /// Like `build()` followed by the `write_*` methods, but without
+    /// materializing the matrix; the counter is emptied. With `compress`, the
+    /// files are gzipped inline (matrix.mtx.gz, ...). Returns
+    /// (n_genes, n_cells, genes_per_cell, counts_per_cell).
+    #[pyo3(signature = (output_dir, compress = false))]
+    fn stream_outputs<'py>(
+        &mut self,
+        py: Python<'py>,
+        output_dir: &str,
+        compress: bool,
+    ) -> PyResult<(usize, usize, &'py PyArray1<u64>, &'py PyArray1<u64>)> {
+        let counter = std::mem::take(&mut self.inner);
+        let out = py
+            .allow_threads(|| counter.stream_outputs(output_dir, compress))
+            .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?;
+        Ok((
+            out.n_rows,
+            out.n_cols,
+            out.genes_per_cell.into_pyarray(py),
+            out.counts_per_cell.into_pyarray(py),
+        ))
+    }
+
     fn __repr__(&self) -> String {
         format!(
             "GeneCounter(genes={}, cells={})",
@@ -192,3 +333,74 @@ impl PyGeneCounter {
         )
     }
 }
+
+/// Read a Matrix Market file (optionally gzipped) as CSR arrays
+///
+/// Returns (indptr, indices, data, shape). With `transpose`, the file's columns
+/// become rows, so a 10x genes x cells matrix comes back as cells x genes.
+/// `data` is int64 for integer/pattern files and float64 for real ones.
+#[pyfunction]
+#[pyo3(signature = (path, transpose = false))]
+pub fn read_mtx_csr<'py>(
+    py: Python<'py>,
+    path: &str,
+    transpose: bool,
+) -> PyResult<(&'py PyArray1<i64>, &'py PyArray1<i64>, PyObject, (usize, usize))> {
+    let csr = py.allow_threads(|| read_mtx(path, transpose)).map_err(|e| match e {
+        Error::MatrixParse(msg) => PyErr::new::<pyo3::exceptions::PyValueError, _>(msg),
+        e => PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()),
+    })?;
+
+    // Consuming same-size conversions reuse each Vec's buffer, and numpy takes
+    // ownership of it, so no second copy of the matrix is ever alive
+    let indptr: Vec<i64> = csr.indptr.into_iter().map(|p| p as i64).collect();
+    let indices: Vec<i64> = csr.indices.into_iter().map(|i| i as i64).collect();
+    let data: PyObject = if csr.integer {
+        let data: Vec<i64> = csr.data.into_iter().map(|v| v as i64).collect();
+        data.into_pyarray(py).into_py(py)
+    } else {
+        csr.data.into_pyarray(py).into_py(py)
+    };
+    Ok((
+        indptr.into_pyarray(py),
+        indices.into_pyarray(py),
+        data,
+        (csr.n_rows, csr.n_cols),
+    ))
+}
+
+/// Count unique UMIs per (barcode, gene) from gene-tagged R1 reads into `counter`
+///
+/// The gene is the last `:`-separated field of each read id. The whole read
+/// loop runs in Rust with the GIL released. Returns (total_reads,
+/// valid_barcodes, corrected_barcodes, invalid_barcodes).
+#[pyfunction]
+#[pyo3(signature = (r1_path, counter, corrector = None, barcode_start = 0, barcode_len = 16, umi_start = 16, umi_len = 12))]
+pub fn count_tagged_reads(
+    py: Python<'_>,
+    r1_path: &str,
+    mut counter: PyRefMut<'_, PyGeneCounter>,
+    corrector: Option<&PyBarcodeCorrector>,
+    barcode_start: usize,
+    barcode_len: usize,
+    umi_start: usize,
+    umi_len: usize,
+) -> PyResult<(u64, u64, u64, u64)> {
+    let read_structure = ReadStructure::new(barcode_start, barcode_len, umi_start, umi_len, 0);
+    let corrector = corrector.map(|c| &c.inner);
+    let counter = &mut counter.inner;
+
+    let stats = py
+        .allow_threads(|| {
+            let parser = FastqParser::open(r1_path)?;
+            count_tagged(parser, corrector, &read_structure, counter)
+        })
+        .map_err(|e| PyErr::new::<pyo3::exceptions::PyIOError, _>(e.to_string()))?;
+
+    Ok((
+        stats.total_reads,
+        stats.valid_barcodes,
+        stats.corrected_barcodes,
+        stats.invalid_barcodes,
+    ))
+}
@@ -14,6 +14,7 @@ try:
     from sparc._sparc_py import (
         FastqParser,
         FastqRecord,
+        FastqBatch,
         FastqWriter,
         BamParser,
         BamRecord,
@@ -40,7 +41,9 @@ except ImportError:
     _RUST_AVAILABLE = False
 
 # Import Python modules
-from sparc.io import read_fastq, read_bam, read_matrix, write_matrix, write_h5ad, read_h5ad
+from sparc.io import (
+    read_fastq, read_fastq_batches, read_bam, read_matrix, write_matrix, write_h5ad, read_h5ad,
+)
 from sparc.preprocessing import extract_barcodes, correct_barcodes, deduplicate_umis
 from sparc.analysis import to_anndata, from_anndata, run_pipeline, normalize_and_analyze, find_marker_genes
 from sparc.streaming import StreamingProcessor, StreamStats
@@ -51,6 +54,7 @@ if TYPE_CHECKING:
     from sparc._sparc_py import (
         FastqParser,
         FastqRecord,
+        FastqBatch,
         FastqWriter,
         BamParser,
         BamRecord,
@@ -66,6 +70,7 @@ __all__ = [
     # Rust classes
     "FastqParser",
     "FastqRecord",
+    "FastqBatch",
     "FastqWriter",
     "BamParser",
     "BamRecord",
@@ -75,6 +80,7 @@ __all__ = [
     "GeneCounter",
     # I/O functions
     "read_fastq",
+    "read_fastq_batches",
     "read_bam",
     "read_matrix",
     "write_matrix",
@@ -48,19 +48,20 @@ def to_anndata(
     if not _SCANPY_AVAILABLE:
         raise ImportError("scanpy and anndata are required. Install with: pip install scanpy")
 
+    import pandas as pd
+
     if _RUST_AVAILABLE and isinstance(matrix, CountMatrix):
         # Convert from Rust CountMatrix
         barcodes = matrix.barcodes
         genes = matrix.genes
 
-        # Build sparse matrix
-        data = np.array(matrix.values(), dtype=np.float32)
-        row = np.array(matrix.row_indices())
-        col = np.array(matrix.col_indices())
+        # Build sparse matrix directly from CSR arrays (no COO sort/sum pass)
+        indptr, indices, data = matrix.to_csr_arrays()
 
         sparse_mat = sp.csr_matrix(
-            (data, (col, row)),  # cells x genes
+            (data, indices, indptr),  # cells x genes
             shape=(matrix.n_cols, matrix.n_rows),
+            copy=False,
         )
     elif sp.issparse(matrix):
         sparse_mat = matrix
@@ -69,14 +70,12 @@ def to_anndata(
     else:
         raise TypeError(f"Unsupported matrix type: {type(matrix)}")
 
-    # Create AnnData
+    # Barcodes and genes live only in obs_names/var_names, not as extra columns
     adata = ad.AnnData(
         X=sparse_mat,
-        obs={"barcode": barcodes},
-        var={"gene": genes},
+        obs=pd.DataFrame(index=pd.Index(barcodes, copy=False)),
+        var=pd.DataFrame(index=pd.Index(genes, copy=False)),
     )
-    adata.obs_names = barcodes
-    adata.var_names = genes
 
     return adata
 
@@ -110,11 +109,22 @@ def from_anndata(adata: "ad.AnnData") -> "CountMatrix":
     barcodes = list(adata.obs_names)
     genes = list(adata.var_names)
 
-    # Populate counter
-    cx = X.tocoo()
-    for i, j, v in zip(cx.row, cx.col, cx.data):
-        if v > 0:
-            counter.add_count(barcodes[i], genes[j], int(v))
+    # Non-positive (and NaN) entries, e.g. from scaled data, are zeroed before
+    # the unsigned cast so they cannot wrap; zero counts are then skipped
+    data = X.data
+    if data.dtype.kind != "u":
+        data = np.where(data > 0, data, 0)
+
+    # Populate counter from the CSR arrays in a single call into Rust. The
+    # index arrays are widened to int64, which copies them when scipy stores
+    # them as int32 (its default); no COO expansion is ever built
+    counter.add_csr_bulk(
+        X.indptr.astype(np.int64, copy=False),
+        X.indices.astype(np.int64, copy=False),
+        data.astype(np.uint32, copy=False),
+        barcodes,
+        genes,
+    )
 
     return counter.build()
 
@@ -175,7 +185,9 @@ def run_pipeline(
     initial_cells = adata.n_obs
 
     # QC metrics
-    adata.var["mt"] = adata.var_names.str.startswith("MT-") | adata.var_names.str.startswith("mt-")
+    # One vectorized pass over 3-character prefixes (truncating cast to fixed-width)
+    prefixes = adata.var_names.to_numpy().astype("U3")
+    adata.var["mt"] = np.isin(prefixes, ["MT-", "mt-"])
     sc.pp.calculate_qc_metrics(adata, qc_vars=["mt"], percent_top=None, log1p=False, inplace=True)
 
     # Filter cells
@@ -2,6 +2,7 @@
 I/O functions for reading and writing single-cell data.
 """
 
+import functools
 from pathlib import Path
 from typing import Iterator, Optional, Union
 
@@ -12,16 +13,24 @@ try:
     from sparc._sparc_py import (
         FastqParser,
         FastqRecord,
+        FastqBatch,
         BamParser,
         BamRecord,
         CountMatrix,
+        read_mtx_csr,
     )
     _RUST_AVAILABLE = True
 except ImportError:
     _RUST_AVAILABLE = False
 
+# Buffer size for uncompressed matrix outputs
+_WRITE_BUFFER_SIZE = 1 << 20
 
-def read_fastq(path: Union[str, Path]) -> Iterator["FastqRecord"]:
+
+def read_fastq(
+    path: Union[str, Path],
+    buffer_size_kb: int = 256,
+) -> Iterator["FastqRecord"]:
     """
     Read a FASTQ file and iterate over records.
 
@@ -29,6 +38,8 @@ def read_fastq(path: Union[str, Path]) -> Iterator["FastqRecord"]:
     ----------
     path : str or Path
         Path to FASTQ file (supports .gz and .zst compression)
+    buffer_size_kb : int
+        Read buffer size in KiB (default: 256)
 
     Yields
     ------
@@ -38,24 +49,68 @@ def read_fastq(path: Union[str, Path]) -> Iterator["FastqRecord"]:
     if not _RUST_AVAILABLE:
         raise ImportError("Rust bindings not available. Install with: pip install sparc")
 
-    parser = FastqParser(str(path))
+    parser = FastqParser(str(path), buffer_size_kb)
     for record in parser:
         yield record
 
 
+def read_fastq_batches(
+    path: Union[str, Path],
+    batch_size: int = 4096,
+    buffer_size_kb: int = 256,
+) -> Iterator["FastqBatch"]:
+    """
+    Read a FASTQ file in batches of records.
+
+    Each batch keeps its records in one contiguous bytes buffer, so no Python
+    object is created per read unless a record is accessed. Prefer this over
+    ``read_fastq`` when only some fields of each read are needed.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path to FASTQ file (supports .gz and .zst compression)
+    batch_size : int
+        Maximum number of records per batch (default: 4096)
+    buffer_size_kb : int
+        Read buffer size in KiB (default: 256)
+
+    Yields
+    ------
+    FastqBatch
+        Batch supporting ``len()``, indexing (returns a FastqRecord), and
+        ``id(i)``, ``seq(i)`` and ``qual(i)`` accessors
+    """
+    if not _RUST_AVAILABLE:
+        raise ImportError("Rust bindings not available. Install with: pip install sparc")
+
+    parser = FastqParser(str(path), buffer_size_kb)
+    while True:
+        batch = parser.next_batch(batch_size)
+        if len(batch) == 0:
+            break
+        yield batch
+
+
 def read_bam(
     path: Union[str, Path],
     min_mapq: int = 0,
+    batch_size: int = 4096,
 ) -> Iterator["BamRecord"]:
     """
     Read a BAM file and iterate over records.
 
+    Records below ``min_mapq`` are skipped in Rust, and records are fetched
+    ``batch_size`` at a time to reduce calls across the binding.
+
     Parameters
     ----------
     path : str or Path
         Path to BAM file
     min_mapq : int, optional
         Minimum mapping quality filter (default: 0)
+    batch_size : int, optional
+        Number of records fetched per call into Rust (default: 4096)
 
     Yields
     ------
@@ -65,10 +120,12 @@ def read_bam(
     if not _RUST_AVAILABLE:
         raise ImportError("Rust bindings not available. Install with: pip install sparc")
 
-    parser = BamParser(str(path))
-    for record in parser:
-        if record.mapq >= min_mapq:
-            yield record
+    parser = BamParser(str(path), min_mapq)
+    while True:
+        batch = parser.next_batch(batch_size)
+        if not batch:
+            break
+        yield from batch
 
 
 def read_matrix(
@@ -107,9 +164,7 @@ def read_matrix(
             f"Available files: {[f.name for f in path.iterdir()]}"
         )
 
-    opener = _open_maybe_gz(barcodes_file)
-    with opener as f:
-        barcodes = [line.strip() for line in f if line.strip()]
+    barcodes = [line.strip() for line in _read_lines(barcodes_file) if line.strip()]
 
     # Read genes
     genes_file = path / "genes.tsv"
@@ -125,12 +180,7 @@ def read_matrix(
             f"Available files: {[f.name for f in path.iterdir()]}"
         )
 
-    genes = []
-    opener = _open_maybe_gz(genes_file)
-    with opener as f:
-        for line in f:
-            parts = line.strip().split("\t")
-            genes.append(parts[0] if parts else "")
+    genes = [line.strip().split("\t", 1)[0] for line in _read_lines(genes_file)]
 
     # Read matrix
     mtx_file = path / "matrix.mtx"
@@ -142,8 +192,20 @@ def read_matrix(
             f"Available files: {[f.name for f in path.iterdir()]}"
         )
 
-    from scipy.io import mmread
-    matrix = mmread(str(mtx_file)).T.tocsr()
+    matrix = None
+    if _RUST_AVAILABLE:
+        try:
+            indptr, indices, data, shape = read_mtx_csr(str(mtx_file), transpose=True)
+            matrix = sp.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+        except ValueError:
+            # Layouts the Rust reader does not handle (array, symmetric, complex)
+            matrix = None
+
+    if matrix is None:
+        from scipy.io import mmread
+        matrix = mmread(str(mtx_file)).T.tocsr()
+    elif not matrix.has_canonical_format:
+        matrix.sum_duplicates()
 
     return matrix, barcodes, genes
 
@@ -177,28 +239,22 @@ def write_matrix(
     path = Path(path)
     path.mkdir(parents=True, exist_ok=True)
 
+    # Stream straight into the final files; gzip is applied on the fly, and
+    # plain files get a 1 MiB buffer so large matrices take fewer write calls
+    suffix = ".gz" if compress else ""
+    opener = gzip.open if compress else functools.partial(open, buffering=_WRITE_BUFFER_SIZE)
+
     # Write matrix (transpose to genes x cells for 10x format)
-    mtx_path = path / "matrix.mtx"
-    mmwrite(str(mtx_path), matrix.T.tocoo())
+    with opener(path / f"matrix.mtx{suffix}", "wb") as f:
+        mmwrite(f, matrix.T.tocoo())
 
     # Write barcodes
-    barcodes_path = path / "barcodes.tsv"
-    with open(barcodes_path, "w") as f:
-        for bc in barcodes:
-            f.write(f"{bc}\n")
+    with opener(path / f"barcodes.tsv{suffix}", "wt") as f:
+        f.writelines(f"{bc}\n" for bc in barcodes)
 
     # Write genes
-    genes_path = path / "genes.tsv"
-    with open(genes_path, "w") as f:
-        for gene in genes:
-            f.write(f"{gene}\t{gene}\n")
-
-    if compress:
-        for file_path in [mtx_path, barcodes_path, genes_path]:
-            with open(file_path, "rb") as f_in:
-                with gzip.open(f"{file_path}.gz", "wb") as f_out:
-                    f_out.write(f_in.read())
-            file_path.unlink()
+    with opener(path / f"genes.tsv{suffix}", "wt") as f:
+        f.writelines(f"{gene}\t{gene}\n" for gene in genes)
 
 
 def write_h5ad(
@@ -278,9 +334,9 @@ def read_h5ad(
     return matrix, barcodes, genes
 
 
-def _open_maybe_gz(path: Path):
-    """Open a file, auto-detecting gzip compression."""
+def _read_lines(path: Path) -> list[str]:
+    """Read a text file (optionally gzipped) in one go and split it into lines."""
     import gzip
-    if str(path).endswith(".gz"):
-        return gzip.open(path, "rt")
-    return open(path)
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.read().decode().splitlines()
@@ -60,10 +60,15 @@ def plot_qc_scatter(
     y: str = "n_genes_by_counts",
     color: str = "pct_counts_mt",
     save: Optional[str] = None,
+    hexbin_threshold: int = 50_000,
 ) -> None:
     """
     Plot QC metrics as scatter plot.
 
+    Above ``hexbin_threshold`` cells the points are aggregated with
+    ``ax.hexbin`` (mean color per bin), which renders in time proportional
+    to the number of bins rather than the number of cells.
+
     Parameters
     ----------
     adata : AnnData
@@ -76,27 +81,42 @@ def plot_qc_scatter(
         Color metric
     save : str, optional
         Path to save figure
+    hexbin_threshold : int
+        Cell count above which to hex-bin instead of scatter (default: 50000)
     """
     if not _PLOTTING_AVAILABLE:
         raise ImportError("matplotlib and plotly are required")
 
     fig, ax = plt.subplots(figsize=(8, 6))
 
-    scatter = ax.scatter(
-        adata.obs[x],
-        adata.obs[y],
-        c=adata.obs[color] if color in adata.obs.columns else None,
-        cmap="viridis",
-        s=1,
-        alpha=0.5,
-    )
+    has_color = color in adata.obs.columns
+    if adata.n_obs > hexbin_threshold:
+        mappable = ax.hexbin(
+            adata.obs[x],
+            adata.obs[y],
+            C=adata.obs[color] if has_color else None,
+            reduce_C_function=np.mean,
+            gridsize=200,
+            bins=None if has_color else "log",
+            cmap="viridis",
+            mincnt=1,
+        )
+        plt.colorbar(mappable, label=color if has_color else "cells")
+    else:
+        mappable = ax.scatter(
+            adata.obs[x],
+            adata.obs[y],
+            c=adata.obs[color] if has_color else None,
+            cmap="viridis",
+            s=1,
+            alpha=0.5,
+        )
+        if has_color:
+            plt.colorbar(mappable, label=color)
 
     ax.set_xlabel(x)
     ax.set_ylabel(y)
 
-    if color in adata.obs.columns:
-        plt.colorbar(scatter, label=color)
-
     if save:
         plt.savefig(save, dpi=150, bbox_inches="tight")
     else:
@@ -108,10 +128,16 @@ def plot_umap_interactive(
     color: str = "leiden",
     hover_data: Optional[list[str]] = None,
     title: Optional[str] = None,
+    max_points: Optional[int] = 50_000,
+    gridsize: int = 300,
 ) -> "go.Figure":
     """
     Create interactive UMAP plot with Plotly.
 
+    Above ``max_points`` cells, cells are pre-aggregated onto a
+    ``gridsize`` x ``gridsize`` grid (per category of ``color``), so the
+    browser draws one marker per occupied bin instead of one per cell.
+
     Parameters
     ----------
     adata : AnnData
@@ -122,6 +148,10 @@ def plot_umap_interactive(
         Additional columns to show on hover
     title : str, optional
         Plot title
+    max_points : int, optional
+        Cell count above which to aggregate (default: 50000, None disables)
+    gridsize : int
+        Number of bins per axis when aggregating (default: 300)
 
     Returns
     -------
@@ -149,13 +179,19 @@ def plot_umap_interactive(
 
     import pandas as pd
     df = pd.DataFrame(hover_dict)
+    hover_cols = list(hover_dict.keys())
+
+    if max_points is not None and len(df) > max_points:
+        color_col = color if color in df.columns else None
+        df = _aggregate_points(df, "UMAP1", "UMAP2", color_col, gridsize)
+        hover_cols.append("n_cells")
 
     fig = px.scatter(
         df,
         x="UMAP1",
         y="UMAP2",
         color=color if color in df.columns else None,
-        hover_data=list(hover_dict.keys()),
+        hover_data=hover_cols,
         title=title or f"UMAP colored by {color}",
     )
 
@@ -169,6 +205,37 @@ def plot_umap_interactive(
     return fig
 
 
+def _aggregate_points(df, x: str, y: str, by: Optional[str], gridsize: int):
+    """
+    Collapse points onto a gridsize x gridsize grid.
+
+    Returns one row per occupied bin (and per category of a non-numeric
+    ``by`` column) with numeric columns averaged, other columns taken from
+    the first point, and the number of points in ``n_cells``.
+    """
+    import pandas as pd
+
+    keys = []
+    for axis in (x, y):
+        values = df[axis].to_numpy()
+        lo, hi = np.nanmin(values), np.nanmax(values)
+        span = hi - lo if hi > lo else 1.0
+        keys.append(np.minimum(((values - lo) / span * gridsize).astype(np.int64), gridsize - 1))
+    if by is not None and not pd.api.types.is_numeric_dtype(df[by]):
+        keys.append(df[by].to_numpy())
+
+    agg = {
+        col: "mean" if pd.api.types.is_numeric_dtype(df[col]) else "first"
+        for col in df.columns
+    }
+    grouped = df.groupby(keys, sort=False, observed=True)
+    out = grouped.agg(agg).reset_index(drop=True)
+    out["n_cells"] = grouped.size().to_numpy()
+    if by is not None and isinstance(df[by].dtype, pd.CategoricalDtype):
+        out[by] = pd.Categorical(out[by], categories=df[by].cat.categories)
+    return out
+
+
 def plot_gene_expression(
     adata: "ad.AnnData",
     genes: Union[str, list[str]],
@@ -199,10 +266,14 @@ def plot_knee(
     counts_per_cell: np.ndarray,
     expected_cells: Optional[int] = None,
     save: Optional[str] = None,
+    max_points: int = 2000,
 ) -> None:
     """
     Plot knee plot for cell calling.
 
+    The curve is drawn through at most ``max_points`` log-spaced ranks,
+    which is visually identical on log-log axes to plotting every barcode.
+
     Parameters
     ----------
     counts_per_cell : array
@@ -211,21 +282,29 @@ def plot_knee(
         Expected number of cells
     save : str, optional
         Path to save figure
+    max_points : int
+        Maximum number of ranks to draw (default: 2000)
     """
     if not _PLOTTING_AVAILABLE:
         raise ImportError("matplotlib is required")
 
     sorted_counts = np.sort(counts_per_cell)[::-1]
-    ranks = np.arange(1, len(sorted_counts) + 1)
+    n_barcodes = len(sorted_counts)
+
+    # Log-spaced ranks always keep the first and last barcode
+    if n_barcodes > max_points:
+        ranks = np.unique(np.geomspace(1, n_barcodes, num=max_points).astype(np.int64))
+    else:
+        ranks = np.arange(1, n_barcodes + 1)
 
     fig, ax = plt.subplots(figsize=(8, 6))
 
-    ax.loglog(ranks, sorted_counts, linewidth=1)
+    ax.loglog(ranks, sorted_counts[ranks - 1], linewidth=1)
     ax.set_xlabel("Barcode rank")
     ax.set_ylabel("UMI counts")
     ax.set_title("Knee plot")
 
-    if expected_cells is not None and expected_cells < len(sorted_counts):
+    if expected_cells is not None and expected_cells < n_barcodes:
         ax.axvline(expected_cells, color="red", linestyle="--", label=f"Expected: {expected_cells}")
         ax.legend()
 
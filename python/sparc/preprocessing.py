@@ -2,6 +2,7 @@
 Preprocessing utilities for single-cell data.
 """
 
+import functools
 from pathlib import Path
 from typing import Optional, Union
 from dataclasses import dataclass
@@ -10,10 +11,10 @@ import numpy as np
 
 try:
     from sparc._sparc_py import (
-        FastqParser,
         Whitelist,
         BarcodeCorrector,
         GeneCounter,
+        extract_barcodes_bulk,
     )
     _RUST_AVAILABLE = True
 except ImportError:
@@ -71,58 +72,46 @@ def extract_barcodes(
     if not _RUST_AVAILABLE:
         raise ImportError("Rust bindings not available")
 
-    whitelist = Whitelist(str(whitelist_path))
-    corrector = BarcodeCorrector(whitelist, max_mismatch)
-
-    parser = FastqParser(str(r1_path))
+    corrector = _load_corrector(whitelist_path, max_mismatch)
+
+    # The whole read loop runs in Rust; barcodes/UMIs come back as fixed-width byte arrays
+    total_reads, valid_barcodes, corrected_barcodes, barcode_arr, umi_arr = extract_barcodes_bulk(
+        str(r1_path),
+        corrector,
+        barcode_start,
+        barcode_len,
+        umi_start,
+        umi_len,
+        float(min_quality),
+    )
 
-    total_reads = 0
-    valid_barcodes = 0
-    corrected_barcodes = 0
-    valid_umis = 0
-    barcodes = []
-    umis = []
+    return ExtractionResult(
+        total_reads=total_reads,
+        valid_barcodes=valid_barcodes,
+        corrected_barcodes=corrected_barcodes,
+        valid_umis=valid_barcodes,
+        barcodes=_decode_fixed_width(barcode_arr),
+        umis=_decode_fixed_width(umi_arr),
+    )
 
-    for record in parser:
-        total_reads += 1
 
-        # Check read length
-        if len(record.seq) < barcode_start + barcode_len + umi_len:
-            continue
+def _load_corrector(whitelist_path: Union[str, Path], max_mismatch: int) -> "BarcodeCorrector":
+    """Return a cached corrector, rebuilt only when the whitelist file changes."""
+    path = Path(whitelist_path).resolve()
+    return _get_corrector(str(path), path.stat().st_mtime_ns, max_mismatch)
 
-        # Extract barcode and UMI
-        barcode_seq = record.subsequence(barcode_start, barcode_len)
-        umi_seq = record.subsequence(umi_start, umi_len)
 
-        if barcode_seq is None or umi_seq is None:
-            continue
+@functools.lru_cache(maxsize=4)
+def _get_corrector(path_str: str, mtime_ns: int, max_mismatch: int) -> "BarcodeCorrector":
+    """Build a corrector; keyed on mtime so edits to the whitelist are picked up."""
+    return BarcodeCorrector(Whitelist(path_str), max_mismatch)
 
-        barcode_str = bytes(barcode_seq).decode("ascii", errors="ignore")
-        umi_str = bytes(umi_seq).decode("ascii", errors="ignore")
 
-        # Match barcode
-        status, corrected, _ = corrector.match_barcode(barcode_str)
-
-        if status == "exact":
-            valid_barcodes += 1
-            barcodes.append(corrected)
-            umis.append(umi_str)
-            valid_umis += 1
-        elif status == "corrected":
-            valid_barcodes += 1
-            corrected_barcodes += 1
-            barcodes.append(corrected)
-            umis.append(umi_str)
-            valid_umis += 1
-
-    return ExtractionResult(
-        total_reads=total_reads,
-        valid_barcodes=valid_barcodes,
-        corrected_barcodes=corrected_barcodes,
-        valid_umis=valid_umis,
-        barcodes=barcodes,
-        umis=umis,
-    )
+def _decode_fixed_width(arr: np.ndarray) -> list[str]:
+    """Decode a (n, width) uint8 array of ASCII sequences into a list of str."""
+    if arr.shape[0] == 0:
+        return []
+    return arr.view(f"S{arr.shape[1]}").ravel().astype(str).tolist()
 
 
 def correct_barcodes(
@@ -150,8 +139,7 @@ def correct_barcodes(
     if not _RUST_AVAILABLE:
         raise ImportError("Rust bindings not available")
 
-    whitelist = Whitelist(str(whitelist_path))
-    corrector = BarcodeCorrector(whitelist, max_mismatch)
+    corrector = _load_corrector(whitelist_path, max_mismatch)
 
     return corrector.correct_batch(barcodes)
 
@@ -181,25 +169,23 @@ def deduplicate_umis(
     tuple
         (unique_barcodes, unique_genes, representative_umis, counts)
     """
-    from collections import defaultdict
-
-    # Group by barcode-gene
-    groups = defaultdict(list)
-    for bc, umi, gene in zip(barcodes, umis, genes):
-        groups[(bc, gene)].append(umi)
-
-    unique_barcodes = []
-    unique_genes = []
-    representative_umis = []
-    counts = []
-
-    for (bc, gene), umi_list in groups.items():
-        # Simple deduplication: count unique UMIs
-        # For proper clustering, use the Rust implementation
-        unique_umis = set(umi_list)
-        unique_barcodes.append(bc)
-        unique_genes.append(gene)
-        representative_umis.append(list(unique_umis)[0])
-        counts.append(len(unique_umis))
-
-    return unique_barcodes, unique_genes, representative_umis, counts
+    import pandas as pd
+
+    if len(barcodes) == 0:
+        return [], [], [], []
+
+    # Group by barcode-gene in pandas' hash groupby (first-seen group order)
+    df = pd.DataFrame({"barcode": barcodes, "gene": genes, "umi": umis})
+    grouped = df.groupby(["barcode", "gene"], sort=False)["umi"]
+
+    # Simple deduplication: count unique UMIs
+    # For proper clustering, use the Rust implementation
+    counts = grouped.nunique()
+    representative_umis = grouped.first()
+
+    return (
+        counts.index.get_level_values("barcode").tolist(),
+        counts.index.get_level_values("gene").tolist(),
+        representative_umis.tolist(),
+        counts.tolist(),
+    )
@@ -56,7 +56,7 @@ class TestIO:
         assert genes2 == genes
 
     def test_write_matrix_compressed(self, tmp_dir, sample_matrix):
-        from sparc.io import write_matrix
+        from sparc.io import read_matrix, write_matrix
 
         matrix, barcodes, genes = sample_matrix
         out_dir = tmp_dir / "compressed"
@@ -68,6 +68,12 @@ class TestIO:
         assert (out_dir / "genes.tsv.gz").exists()
         assert not (out_dir / "matrix.mtx").exists()
 
+        # Roundtrip
+        matrix2, barcodes2, genes2 = read_matrix(out_dir)
+        assert (matrix2 != matrix).nnz == 0
+        assert barcodes2 == barcodes
+        assert genes2 == genes
+
 
 class TestAnalysis:
     """Tests for sparc.analysis module."""
@@ -82,6 +88,9 @@ class TestAnalysis:
 
         assert adata.n_obs == len(barcodes)
         assert adata.n_vars == len(genes)
+        assert list(adata.obs_names) == barcodes
+        assert list(adata.var_names) == genes
+        assert adata.obs.columns.empty and adata.var.columns.empty
 
     def test_from_anndata_roundtrip(self, sample_matrix):
         pytest.importorskip("anndata")
@@ -96,6 +105,20 @@ class TestAnalysis:
         assert count_matrix.n_cols == len(barcodes)
         assert count_matrix.n_rows == len(genes)
 
+    def test_from_anndata_skips_non_positive(self):
+        pytest.importorskip("anndata")
+        pytest.importorskip("scanpy")
+        pytest.importorskip("sparc._sparc_py")
+        from sparc.analysis import from_anndata, to_anndata
+
+        # Scaled data holds negative floats, which must not wrap to huge counts
+        matrix = sp.csr_matrix(np.array([[2.0, -1.5], [-2.0, 3.7]]))
+        adata = to_anndata(matrix, ["CELL1", "CELL2"], ["GENE1", "GENE2"])
+        count_matrix = from_anndata(adata)
+
+        assert count_matrix.nnz == 2
+        assert sorted(count_matrix.values().tolist()) == [2, 3]
+
     def test_normalize_and_analyze(self, sample_matrix):
         pytest.importorskip("anndata")
         sc = pytest.importorskip("scanpy")
@@ -137,6 +160,93 @@ class TestAnalysis:
         assert adata.uns.get("rank_genes_groups") is not None
 
 
+class TestPreprocessing:
+    """Tests for sparc.preprocessing module."""
+
+    def test_deduplicate_umis(self):
+        from sparc.preprocessing import deduplicate_umis
+
+        barcodes = ["CELL1", "CELL1", "CELL1", "CELL2", "CELL1"]
+        umis = ["AAAA", "AAAA", "CCCC", "GGGG", "TTTT"]
+        genes = ["GENE1", "GENE1", "GENE1", "GENE1", "GENE2"]
+
+        bcs, gs, reps, counts = deduplicate_umis(barcodes, umis, genes)
+
+        assert list(zip(bcs, gs, counts)) == [
+            ("CELL1", "GENE1", 2),
+            ("CELL2", "GENE1", 1),
+            ("CELL1", "GENE2", 1),
+        ]
+        assert reps == ["AAAA", "GGGG", "TTTT"]
+
+    def test_deduplicate_umis_empty(self):
+        from sparc.preprocessing import deduplicate_umis
+
+        assert deduplicate_umis([], [], []) == ([], [], [], [])
+
+    def test_correct_barcodes_reuses_corrector(self, tmp_dir):
+        pytest.importorskip("sparc._sparc_py")
+        import os
+
+        from sparc.preprocessing import _get_corrector, correct_barcodes
+
+        whitelist = tmp_dir / "whitelist.txt"
+        whitelist.write_text("AAAACCCC\nGGGGTTTT\n")
+        _get_corrector.cache_clear()
+
+        assert correct_barcodes(["AAAACCCG"], whitelist) == ["AAAACCCC"]
+        assert correct_barcodes(["GGGGTTTA"], whitelist) == ["GGGGTTTT"]
+        assert _get_corrector.cache_info().misses == 1
+
+        # Rewriting the whitelist invalidates the cached corrector
+        whitelist.write_text("CCCCAAAA\n")
+        stat = whitelist.stat()
+        os.utime(whitelist, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert correct_barcodes(["AAAACCCG"], whitelist) == [None]
+        assert _get_corrector.cache_info().misses == 2
+
+
+class TestPlotting:
+    """Tests for sparc.plotting module."""
+
+    def test_plot_umap_interactive_aggregates(self):
+        pytest.importorskip("plotly")
+        ad = pytest.importorskip("anndata")
+        import pandas as pd
+        from sparc.plotting import plot_umap_interactive
+
+        rng = np.random.default_rng(0)
+        n = 500
+        adata = ad.AnnData(obs=pd.DataFrame(
+            {"leiden": pd.Categorical(rng.choice(["0", "1"], n))},
+            index=[f"CELL{i}" for i in range(n)],
+        ))
+        adata.obsm["X_umap"] = rng.normal(size=(n, 2))
+
+        fig = plot_umap_interactive(adata, max_points=100, gridsize=5)
+        n_points = sum(len(trace.x) for trace in fig.data)
+        assert n_points <= 5 * 5 * 2
+
+        fig = plot_umap_interactive(adata, max_points=None)
+        assert sum(len(trace.x) for trace in fig.data) == n
+
+    def test_plot_knee_decimates(self, tmp_dir):
+        matplotlib = pytest.importorskip("matplotlib")
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from sparc.plotting import plot_knee
+
+        counts = np.random.default_rng(0).integers(1, 10000, size=100_000)
+        plot_knee(counts, expected_cells=500, save=str(tmp_dir / "knee.png"), max_points=200)
+
+        line = plt.gcf().axes[0].get_lines()[0]
+        x, y = line.get_data()
+        assert len(x) <= 200
+        assert x[0] == 1 and x[-1] == len(counts)
+        assert y[0] == counts.max() and y[-1] == counts.min()
+        plt.close("all")
+
+
 class TestStreaming:
     """Tests for sparc.streaming module."""
 
@@ -0,0 +1,390 @@
+"""Tests for the SPARC web backend."""
+
+import asyncio
+import gzip
+import importlib
+import importlib.util
+import json
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# The backend is imported as web.backend.*, relative to the repository root
+_REPO_ROOT = str(Path(__file__).resolve().parents[2])
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+BARCODES = ["AAACCCAAGAAACACT", "TTTGTCATCAGTTAGC"]
+
+
+def _fastq(n_reads=40):
+    """Gene-tagged R1 reads (READ:BARCODE:GENE), as the worker expects."""
+    lines = []
+    for i in range(n_reads):
+        barcode = BARCODES[i % 2]
+        umi = "".join("ACGT"[(i >> (2 * k)) & 3] for k in range(12))
+        seq = barcode + umi
+        lines += [f"@READ{i}:{barcode}:GENE{i % 3}", seq, "+", "I" * len(seq)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    """Import the backend against fakeredis, with Celery tasks run eagerly."""
+    for module in ("fastapi", "multipart", "httpx", "orjson", "celery"):
+        pytest.importorskip(module)
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+    import redis.asyncio as aioredis
+
+    server = fakeredis.FakeServer()
+    root = tmp_path_factory.mktemp("web")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("REDIS_URL", "redis://fake:6379/0")
+        mp.setenv("SPARC_API_TOKENS", "")
+        mp.setenv("SPARC_UPLOAD_DIR", str(root / "uploads"))
+        mp.setenv("SPARC_OUTPUT_DIR", str(root / "outputs"))
+        mp.setattr(
+            redis.Redis, "from_url",
+            classmethod(lambda cls, url, **kw: fakeredis.FakeRedis(server=server, **kw)),
+        )
+        mp.setattr(
+            aioredis.Redis, "from_url",
+            classmethod(lambda cls, url, **kw: fakeredis.FakeAsyncRedis(server=server, **kw)),
+        )
+        # Configuration is read at import, so import fresh under the patches
+        for name in [m for m in sys.modules if m.startswith("web.backend")]:
+            mp.delitem(sys.modules, name)
+        pipeline = importlib.import_module("web.backend.workers.pipeline")
+        routes = importlib.import_module("web.backend.api.routes")
+        websocket = importlib.import_module("web.backend.api.websocket")
+
+        # Eager tasks don't need a broker; fall back to JSON without msgpack
+        pipeline.celery_app.conf.update(task_always_eager=True, task_store_eager_result=False)
+        if importlib.util.find_spec("msgpack") is None:
+            pipeline.celery_app.conf.update(task_serializer="json", result_serializer="json")
+
+        yield SimpleNamespace(
+            pipeline=pipeline, routes=routes, websocket=websocket,
+            redis=fakeredis.FakeRedis(server=server, decode_responses=True),
+        )
+
+
+@pytest.fixture
+def client(backend):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.include_router(backend.routes.router)
+    app.include_router(backend.websocket.websocket_router, prefix="/ws")
+    with TestClient(app) as c:
+        yield c
+
+
+def _upload(client, whitelist=True):
+    files = {"r1": ("sample_R1.fastq", _fastq())}
+    if whitelist:
+        files["whitelist"] = ("whitelist.txt", ("\n".join(BARCODES) + "\n").encode())
+    response = client.post("/upload", files=files)
+    assert response.status_code == 200
+    return response.json()["job_id"]
+
+
+class FakeWebSocket:
+    """Records frames sent through ConnectionManager."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def _job(backend, job_id):
+    return json.loads(backend.redis.get(f"sparc:job:{job_id}"))
+
+
+class TestUpload:
+    """Tests for streamed uploads."""
+
+    def test_upload_streams_to_disk(self, backend, client):
+        job_id = _upload(client)
+
+        job_dir = backend.routes.UPLOAD_DIR / job_id
+        assert (job_dir / "sample_R1.fastq").read_bytes() == _fastq()
+        assert not list(job_dir.glob("*.part"))
+
+    def test_upload_too_large(self, backend, client, monkeypatch):
+        monkeypatch.setattr(backend.routes, "MAX_UPLOAD_SIZE", 10)
+        before = set(backend.routes.UPLOAD_DIR.iterdir())
+
+        response = client.post("/upload", files={"r1": ("sample_R1.fastq", _fastq())})
+
+        assert response.status_code == 413
+        assert set(backend.routes.UPLOAD_DIR.iterdir()) == before
+
+    def test_upload_invalid_fastq(self, client):
+        response = client.post("/upload", files={"r1": ("sample_R1.fastq", b"not a fastq\n")})
+        assert response.status_code == 400
+
+
+class TestPipeline:
+    """Tests for pipeline runs."""
+
+    def test_pipeline_compressed_outputs(self, backend, client):
+        assert backend.routes._USE_CELERY
+        job_id = _upload(client)
+
+        response = client.post(f"/pipeline/{job_id}", json={"compress_outputs": True})
+        assert response.status_code == 200
+
+        status = client.get(f"/pipeline/{job_id}/status").json()
+        assert status["status"] == "completed"
+        assert status["result"]["cells"] == 2
+
+        files = client.get(f"/pipeline/{job_id}/results").json()["files"]
+        assert files == {
+            "matrix": "matrix.mtx.gz",
+            "barcodes": "barcodes.tsv.gz",
+            "genes": "genes.tsv.gz",
+            "qc_report": "qc_report.json",
+        }
+        with gzip.open(backend.routes.OUTPUT_DIR / job_id / "barcodes.tsv.gz", "rt") as f:
+            assert sorted(f.read().split()) == sorted(BARCODES)
+
+
+class TestJobStore:
+    """Tests for the Redis job store and Celery job status."""
+
+    def test_list_jobs(self, backend, client):
+        job_ids = {str(uuid.uuid4()) for _ in range(3)}
+        for job_id in job_ids:
+            job = {"job_id": job_id, "status": "queued", "progress": 0.0, "message": ""}
+            asyncio.run(backend.routes._set_job(job_id, job))
+
+        listed = {job["job_id"] for job in client.get("/jobs").json()["jobs"]}
+        assert job_ids <= listed
+        assert {job["job_id"] for job in backend.routes._list_redis_jobs()} == listed
+
+    def _run_failing_task(self, backend, monkeypatch, tmp_path, error):
+        def fail(**kwargs):
+            raise error
+
+        monkeypatch.setattr(backend.pipeline, "run_pipeline", fail)
+        job_id = str(uuid.uuid4())
+        backend.pipeline.run_pipeline_task.apply(
+            args=(job_id, "sample_R1.fastq", None, None, str(tmp_path), {}),
+        )
+        return _job(backend, job_id)
+
+    def test_task_error_marks_job_failed(self, backend, monkeypatch, tmp_path):
+        job = self._run_failing_task(backend, monkeypatch, tmp_path, RuntimeError("boom"))
+        assert job["status"] == "failed"
+        assert job["message"] == "Pipeline error: boom"
+
+    def test_soft_time_limit_marks_job_failed(self, backend, monkeypatch, tmp_path):
+        from celery.exceptions import SoftTimeLimitExceeded
+
+        job = self._run_failing_task(backend, monkeypatch, tmp_path, SoftTimeLimitExceeded())
+        assert job["status"] == "failed"
+        assert job["message"] == "Pipeline timed out"
+
+    def test_restart_stale_job(self, backend, client):
+        job_id = _upload(client)
+        job = {"job_id": job_id, "status": "running", "progress": 0.1, "message": ""}
+
+        asyncio.run(backend.routes._set_job(job_id, {**job, "started_at": time.time()}))
+        assert client.post(f"/pipeline/{job_id}", json={}).status_code == 409
+
+        started_at = time.time() - backend.routes.PIPELINE_TIMEOUT - 1
+        asyncio.run(backend.routes._set_job(job_id, {**job, "started_at": started_at}))
+        assert client.post(f"/pipeline/{job_id}", json={}).status_code == 200
+        assert _job(backend, job_id)["status"] == "completed"
+
+
+class TestWebSocket:
+    """Tests for WebSocket progress delivery."""
+
+    def test_progress_over_websocket(self, backend, client):
+        job_id = str(uuid.uuid4())
+        with client.websocket_connect(f"/ws/pipeline/{job_id}") as ws:
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+
+            # No drainer runs here, so the update is broadcast immediately
+            ws.portal.call(backend.websocket.send_progress_update, job_id, 0.5, "Counting")
+            assert ws.receive_json() == {
+                "type": "progress", "job_id": job_id,
+                "progress": 0.5, "message": "Counting", "status": "running",
+            }
+
+    def test_drainer_coalesces_progress(self, backend):
+        async def run():
+            manager = backend.websocket.ConnectionManager()
+            ws = FakeWebSocket()
+            await manager.connect(ws, "job")
+            drainer = asyncio.create_task(manager.run_drainer())
+            await asyncio.sleep(0)
+
+            for progress in (0.2, 0.6, 0.4):
+                update = {"type": "progress", "progress": progress, "message": str(progress)}
+                await manager.publish("job", update)
+            await manager.publish("job", {"type": "result", "result": {"cells": 2}})
+            await manager.publish("job", {"type": "progress", "progress": 1.0, "message": "done"})
+            await asyncio.sleep(backend.websocket.COALESCE_INTERVAL + 0.1)
+
+            drainer.cancel()
+            await asyncio.gather(drainer, return_exceptions=True)
+            return ws.sent
+
+        assert asyncio.run(run()) == [
+            {"type": "progress", "progress": 0.6, "message": "0.4"},
+            {"type": "result", "result": {"cells": 2}},
+            {"type": "progress", "progress": 1.0, "message": "done"},
+        ]
+
+    def test_drainer_visits_only_pending_jobs(self, backend):
+        async def run():
+            manager = backend.websocket.ConnectionManager()
+            assert manager._dirty is None
+            quiet, busy = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(quiet, "quiet")
+            await manager.connect(busy, "busy")
+            drainer = asyncio.create_task(manager.run_drainer())
+            await asyncio.sleep(0)
+
+            await manager.publish("busy", {"type": "result", "result": {}})
+            await manager.publish("missing", {"type": "result", "result": {}})
+            await asyncio.sleep(backend.websocket.COALESCE_INTERVAL + 0.1)
+
+            drainer.cancel()
+            await asyncio.gather(drainer, return_exceptions=True)
+            assert manager._dirty is None
+            return quiet.sent, busy.sent, manager._pending
+
+        quiet, busy, pending = asyncio.run(run())
+        assert quiet == []
+        assert busy == [{"type": "result", "result": {}}]
+        assert pending == {}
+
+
+class TestSerialization:
+    """Tests for Celery message serialization."""
+
+    def test_task_payload_msgpack_round_trip(self, backend):
+        pytest.importorskip("msgpack")
+        from kombu.serialization import dumps, loads, prepare_accept_content
+
+        conf = backend.pipeline.celery_app.conf
+        assert conf.task_serializer == conf.result_serializer == "msgpack"
+        accept = prepare_accept_content(conf.accept_content)
+
+        config = {"protocol": "10x-3prime-v3", "max_mito": 20.0, "compress_outputs": True}
+        args = [str(uuid.uuid4()), "/data/r1.fastq", None, "/data/whitelist.txt", "/out", config]
+        result = {"total_reads": 40, "cells": 2, "median_umis_per_cell": 13.5}
+        for payload, serializer in ((args, conf.task_serializer), (result, conf.result_serializer)):
+            content_type, encoding, body = dumps(payload, serializer=serializer)
+            assert content_type == "application/x-msgpack"
+            assert loads(body, content_type, encoding, accept=accept) == payload
+
+
+class TestWorkerConfig:
+    """Tests for Celery worker settings."""
+
+    def test_pipeline_task_uses_default_queue(self, backend):
+        celery_app = backend.pipeline.celery_app
+        route = celery_app.amqp.router.route({}, backend.pipeline.run_pipeline_task.name)
+        assert route["queue"].name == celery_app.conf.task_default_queue
+        assert celery_app.conf.worker_prefetch_multiplier == 1
+
+
+class TestProgressRelay:
+    """Tests for worker progress over Redis pub/sub and the job record."""
+
+    def test_task_publishes_result(self, backend, tmp_path):
+        r1 = tmp_path / "sample_R1.fastq"
+        r1.write_bytes(_fastq())
+        whitelist = tmp_path / "whitelist.txt"
+        whitelist.write_text("\n".join(BARCODES) + "\n")
+        job_id = str(uuid.uuid4())
+
+        pubsub = backend.redis.pubsub()
+        pubsub.subscribe(f"sparc:progress:{job_id}")
+        pubsub.get_message(timeout=1)  # subscribe confirmation
+
+        backend.pipeline.run_pipeline_task.apply(
+            args=(job_id, str(r1), None, str(whitelist), str(tmp_path / "out"), {}),
+        )
+
+        frames = []
+        while (message := pubsub.get_message(timeout=0.1)) is not None:
+            frames.append(json.loads(message["data"]))
+        pubsub.close()
+
+        assert [frame["type"] for frame in frames] == ["progress", "progress", "result"]
+        assert frames[1]["status"] == "completed"
+        assert frames[2]["result"]["cells"] == 2
+
+    def test_update_job_keeps_terminal_status(self, backend):
+        job_id = str(uuid.uuid4())
+        backend.pipeline._update_job(job_id, status="completed", progress=1.0)
+        backend.pipeline._update_job(job_id, status="running", progress=0.5)
+        backend.pipeline._update_job(job_id, progress=0.7)
+
+        job = _job(backend, job_id)
+        assert (job["status"], job["progress"]) == ("completed", 1.0)
+
+    def test_update_job_concurrent_writers(self, backend):
+        job_id = str(uuid.uuid4())
+
+        def write(prefix):
+            for i in range(25):
+                backend.pipeline._update_job(job_id, **{f"{prefix}{i}": i})
+
+        writers = [threading.Thread(target=write, args=(prefix,)) for prefix in "abcd"]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        assert len(_job(backend, job_id)) == 1 + 4 * 25
+
+    def test_relay_progress(self, backend, monkeypatch):
+        websocket = backend.websocket
+        monkeypatch.setattr(websocket, "manager", websocket.ConnectionManager())
+        channel = f"{websocket.PROGRESS_CHANNEL_PREFIX}job"
+
+        async def run():
+            ws = FakeWebSocket()
+            await websocket.manager.connect(ws, "job")
+            relay = asyncio.create_task(websocket.relay_progress("redis://fake:6379/0"))
+            await asyncio.sleep(0.2)
+
+            progress = {"type": "progress", "progress": 0.5, "message": "half"}
+            backend.redis.publish(channel, json.dumps(progress))
+            backend.redis.publish(channel, "not json")
+            backend.redis.publish(channel, json.dumps({"type": "progress"}))
+            backend.redis.publish(channel, json.dumps({"type": "result", "result": {"cells": 2}}))
+            await asyncio.sleep(0.3)
+
+            relay.cancel()
+            await asyncio.gather(relay, return_exceptions=True)
+            return ws.sent
+
+        assert asyncio.run(run()) == [
+            {
+                "type": "progress", "job_id": "job",
+                "progress": 0.5, "message": "half", "status": "running",
+            },
+            {"type": "result", "job_id": "job", "result": {"cells": 2}},
+        ]
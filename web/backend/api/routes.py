@@ -11,7 +11,7 @@ import shutil
 import time
 import uuid
 from pathlib import Path, PurePosixPath
-from typing import Optional
+from typing import Callable, Optional
 
 from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks, Depends, Header, Request
 from pydantic import BaseModel, field_validator
@@ -58,6 +58,9 @@ MAX_UPLOAD_SIZE = int(os.getenv("SPARC_MAX_UPLOAD_MB", "5000")) * 1024 * 1024
 MAX_WHITELIST_SIZE = int(os.getenv("SPARC_MAX_WHITELIST_MB", "500")) * 1024 * 1024
 MAX_JOBS = int(os.getenv("SPARC_MAX_JOBS", "100"))
 MAX_CONCURRENT_PIPELINES = int(os.getenv("SPARC_MAX_CONCURRENT", "4"))
+# Pipelines are killed after this long, so an older "running" record is stale
+PIPELINE_TIMEOUT = int(os.getenv("SPARC_PIPELINE_TIMEOUT", "3600"))
+_UPLOAD_CHUNK_SIZE = 1 << 20
 
 # Track running pipelines
 _running_pipelines = 0
@@ -82,9 +85,11 @@ _jobs_mem: dict[str, dict] = {}
 _jobs_lock = asyncio.Lock()
 
 
+# Redis calls are blocking; they run in a thread so the event loop stays free.
+
 async def _get_job(job_id: str) -> Optional[dict]:
     if _USE_REDIS:
-        data = _redis.get(f"sparc:job:{job_id}")
+        data = await asyncio.to_thread(_redis.get, f"sparc:job:{job_id}")
         return json.loads(data) if data else None
     async with _jobs_lock:
         return _jobs_mem.get(job_id)
@@ -92,7 +97,7 @@ async def _get_job(job_id: str) -> Optional[dict]:
 
 async def _set_job(job_id: str, job: dict):
     if _USE_REDIS:
-        _redis.set(f"sparc:job:{job_id}", json.dumps(job), ex=86400)
+        await asyncio.to_thread(_redis.set, f"sparc:job:{job_id}", json.dumps(job), ex=86400)
         return
     async with _jobs_lock:
         if job_id not in _jobs_mem and len(_jobs_mem) >= MAX_JOBS:
@@ -104,7 +109,7 @@ async def _set_job(job_id: str, job: dict):
 
 async def _delete_job(job_id: str):
     if _USE_REDIS:
-        _redis.delete(f"sparc:job:{job_id}")
+        await asyncio.to_thread(_redis.delete, f"sparc:job:{job_id}")
         return
     async with _jobs_lock:
         _jobs_mem.pop(job_id, None)
@@ -112,17 +117,33 @@ async def _delete_job(job_id: str):
 
 async def _list_jobs() -> list[dict]:
     if _USE_REDIS:
-        keys = _redis.keys("sparc:job:*")
-        jobs = []
-        for key in keys:
-            data = _redis.get(key)
-            if data:
-                jobs.append(json.loads(data))
-        return jobs
+        return await asyncio.to_thread(_list_redis_jobs)
     async with _jobs_lock:
         return list(_jobs_mem.values())
 
 
+def _list_redis_jobs() -> list[dict]:
+    keys = list(_redis.scan_iter(match="sparc:job:*", count=500))
+    if not keys:
+        return []
+    return [json.loads(data) for data in _redis.mget(keys) if data]
+
+
+# ─── Pipeline dispatch ───────────────────────────────────────────────
+
+# With Redis available, pipelines run on the Celery worker pool (which also
+# writes job state to Redis); otherwise they run in this process.
+_USE_CELERY = False
+if _USE_REDIS and os.getenv("SPARC_USE_CELERY", "1") != "0":
+    try:
+        from web.backend.workers.pipeline import CELERY_AVAILABLE as _USE_CELERY
+    except ImportError:
+        _USE_CELERY = False
+    if _USE_CELERY:
+        from web.backend.workers.pipeline import run_pipeline_task as _celery_pipeline_task
+        logger.info("Dispatching pipelines to Celery workers")
+
+
 # ─── Security helpers ─────────────────────────────────────────────────
 
 _SAFE_FILENAME_RE = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9._\-]{0,254}$")
@@ -150,6 +171,37 @@ def _relative_path(path: Path, base: Path) -> str:
         return path.name
 
 
+async def _save_upload(
+    upload: UploadFile,
+    dest: Path,
+    max_size: int,
+    too_large_detail: str,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+) -> int:
+    """Stream an upload to disk in 1 MiB chunks, enforcing a size limit.
+
+    Data goes to a ``.part`` file that replaces ``dest`` only once the upload
+    is complete, so an oversized or failed upload never clobbers an existing
+    file. Returns the number of bytes written.
+    """
+    partial = dest.with_name(dest.name + ".part")
+    size = 0
+    try:
+        with open(partial, "wb") as f:
+            while chunk := await upload.read(_UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=too_large_detail)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                f.write(chunk)
+        os.replace(partial, dest)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return size
+
+
 # ─── Validation models ────────────────────────────────────────────────
 
 VALID_PROTOCOLS = {
@@ -168,6 +220,7 @@ class PipelineConfig(BaseModel):
     max_mito: float = 20.0
     n_pcs: int = 50
     resolution: float = 1.0
+    compress_outputs: bool = False
 
     @field_validator("protocol")
     @classmethod
@@ -276,11 +329,8 @@ async def upload_files(
         # Save R1
         r1_name = _sanitize_filename(r1.filename or "r1.fastq")
         r1_path = job_dir / r1_name
-        content = await r1.read()
-        if len(content) > MAX_UPLOAD_SIZE:
-            raise HTTPException(status_code=413, detail="R1 file exceeds max upload size")
-        r1_path.write_bytes(content)
-        logger.info("Job %s: uploaded R1 (%s, %d bytes)", job_id, r1_name, len(content))
+        size = await _save_upload(r1, r1_path, MAX_UPLOAD_SIZE, "R1 file exceeds max upload size")
+        logger.info("Job %s: uploaded R1 (%s, %d bytes)", job_id, r1_name, size)
 
         if not _validate_fastq(r1_path):
             raise HTTPException(status_code=400, detail="R1 does not appear to be a valid FASTQ file")
@@ -290,11 +340,10 @@ async def upload_files(
         if r2:
             r2_name = _sanitize_filename(r2.filename or "r2.fastq")
             r2_path = job_dir / r2_name
-            content = await r2.read()
-            if len(content) > MAX_UPLOAD_SIZE:
-                raise HTTPException(status_code=413, detail="R2 file exceeds max upload size")
-            r2_path.write_bytes(content)
-            logger.info("Job %s: uploaded R2 (%s, %d bytes)", job_id, r2_name, len(content))
+            size = await _save_upload(
+                r2, r2_path, MAX_UPLOAD_SIZE, "R2 file exceeds max upload size"
+            )
+            logger.info("Job %s: uploaded R2 (%s, %d bytes)", job_id, r2_name, size)
 
             if not _validate_fastq(r2_path):
                 raise HTTPException(status_code=400, detail="R2 does not appear to be a valid FASTQ file")
@@ -304,11 +353,10 @@ async def upload_files(
         if whitelist:
             wl_name = _sanitize_filename(whitelist.filename or "whitelist.txt")
             wl_path = job_dir / wl_name
-            content = await whitelist.read()
-            if len(content) > MAX_WHITELIST_SIZE:
-                raise HTTPException(status_code=413, detail="Whitelist file exceeds max size")
-            wl_path.write_bytes(content)
-            logger.info("Job %s: uploaded whitelist (%s, %d bytes)", job_id, wl_name, len(content))
+            size = await _save_upload(
+                whitelist, wl_path, MAX_WHITELIST_SIZE, "Whitelist file exceeds max size"
+            )
+            logger.info("Job %s: uploaded whitelist (%s, %d bytes)", job_id, wl_name, size)
 
     except HTTPException:
         shutil.rmtree(job_dir, ignore_errors=True)
@@ -351,16 +399,22 @@ async def start_pipeline(
 
     existing = await _get_job(job_id)
     if existing and existing.get("status") == "running":
-        raise HTTPException(status_code=409, detail="Pipeline already running for this job")
+        if time.time() - existing.get("started_at", 0) <= PIPELINE_TIMEOUT:
+            raise HTTPException(status_code=409, detail="Pipeline already running for this job")
+        # Its worker died without recording a final status (e.g. hard time limit)
+        logger.warning("Job %s: restarting stale running job", job_id)
 
-    # Check concurrent pipeline limit
-    global _running_pipelines
-    async with _pipeline_lock:
-        if _running_pipelines >= MAX_CONCURRENT_PIPELINES:
-            raise HTTPException(
-                status_code=429,
-                detail=f"Too many concurrent pipelines ({MAX_CONCURRENT_PIPELINES} max). Try again later.",
-            )
+    # Check concurrent pipeline limit (Celery queues instead)
+    if not _USE_CELERY:
+        async with _pipeline_lock:
+            if _running_pipelines >= MAX_CONCURRENT_PIPELINES:
+                raise HTTPException(
+                    status_code=429,
+                    detail=(
+                        f"Too many concurrent pipelines ({MAX_CONCURRENT_PIPELINES} max). "
+                        "Try again later."
+                    ),
+                )
 
     job = {
         "job_id": job_id,
@@ -374,11 +428,43 @@ async def start_pipeline(
     await _set_job(job_id, job)
     logger.info("Job %s: pipeline queued (protocol=%s)", job_id, config.protocol)
 
-    background_tasks.add_task(run_pipeline_task, job_id, config)
+    if _USE_CELERY:
+        r1_path, r2_path, whitelist_path = _find_inputs(job_dir)
+        if not r1_path:
+            raise HTTPException(status_code=400, detail="No R1 FASTQ file found")
+        # The job ID doubles as the Celery task ID
+        await asyncio.to_thread(
+            _celery_pipeline_task.apply_async,
+            args=(
+                job_id, r1_path, r2_path, whitelist_path,
+                str(OUTPUT_DIR / job_id), config.model_dump(),
+            ),
+            task_id=job_id,
+        )
+    else:
+        background_tasks.add_task(run_pipeline_task, job_id, config)
 
     return {"job_id": job_id, "status": "queued"}
 
 
+def _find_inputs(job_dir: Path) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    """Locate (r1, r2, whitelist) paths among a job's uploaded files."""
+    r1_path = None
+    r2_path = None
+    whitelist_path = None
+
+    for f in job_dir.iterdir():
+        name = f.name.lower()
+        if "whitelist" in name or name.endswith(".txt"):
+            whitelist_path = str(f)
+        elif "r2" in name or "_2." in name or "_R2" in f.name:
+            r2_path = str(f)
+        elif r1_path is None:
+            r1_path = str(f)
+
+    return r1_path, r2_path, whitelist_path
+
+
 async def run_pipeline_task(job_id: str, config: PipelineConfig):
     """Run the actual SPARC pipeline as a background task."""
     global _running_pipelines
@@ -395,30 +481,18 @@ async def run_pipeline_task(job_id: str, config: PipelineConfig):
         output_dir = OUTPUT_DIR / job_id
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        r1_path = None
-        r2_path = None
-        whitelist_path = None
-
-        for f in job_dir.iterdir():
-            name = f.name.lower()
-            if "whitelist" in name or name.endswith(".txt"):
-                whitelist_path = str(f)
-            elif "r2" in name or "_2." in name or "_R2" in f.name:
-                r2_path = str(f)
-            elif r1_path is None:
-                r1_path = str(f)
-
+        r1_path, r2_path, whitelist_path = _find_inputs(job_dir)
         if not r1_path:
             raise FileNotFoundError("No R1 FASTQ file found")
 
-        from web.backend.workers.pipeline import run_pipeline
+        from web.backend.workers.pipeline import run_pipeline_async
 
         job.update({"progress": 0.1, "message": "Extracting barcodes and UMIs..."})
         await _set_job(job_id, job)
 
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, run_pipeline,
-            job_id, r1_path, r2_path, whitelist_path, str(output_dir), config.model_dump(),
+        result = await run_pipeline_async(
+            job_id=job_id, r1_path=r1_path, r2_path=r2_path, whitelist_path=whitelist_path,
+            output_dir=str(output_dir), config=config.model_dump(),
         )
 
         if "error" in result:
@@ -471,7 +545,10 @@ async def get_pipeline_results(job_id: str):
     output_dir = OUTPUT_DIR / job_id
     files = {}
     for name in ["matrix.mtx", "barcodes.tsv", "genes.tsv", "qc_report.json"]:
-        files[name.split(".")[0]] = name if (output_dir / name).exists() else None
+        # Outputs may have been written gzipped (compress_outputs)
+        files[name.split(".")[0]] = next(
+            (n for n in (name, f"{name}.gz") if (output_dir / n).exists()), None
+        )
 
     return {"job_id": job_id, "result": job.get("result"), "files": files}
 
@@ -525,11 +602,16 @@ async def upload_custom_whitelist(
     whitelist_dir.mkdir(parents=True, exist_ok=True)
 
     whitelist_path = whitelist_dir / f"{safe_name}.txt"
-    content = await whitelist.read()
-    if len(content) > MAX_WHITELIST_SIZE:
-        raise HTTPException(status_code=413, detail="Whitelist file exceeds max size")
-    whitelist_path.write_bytes(content)
-    line_count = content.decode(errors="replace").count("\n")
+    line_count = 0
+
+    def count_lines(chunk: bytes):
+        nonlocal line_count
+        line_count += chunk.count(b"\n")
+
+    await _save_upload(
+        whitelist, whitelist_path, MAX_WHITELIST_SIZE, "Whitelist file exceeds max size",
+        on_chunk=count_lines,
+    )
     logger.info("Uploaded custom whitelist '%s' (%d barcodes)", safe_name, line_count)
 
     return {"name": safe_name, "barcodes": line_count}
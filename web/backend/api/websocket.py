@@ -5,8 +5,10 @@ WebSocket handlers for real-time progress updates.
 import asyncio
 import logging
 import os
-from typing import Dict, Set
+from typing import Optional
+from weakref import WeakSet
 
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 logger = logging.getLogger("sparc.websocket")
@@ -15,14 +17,22 @@ websocket_router = APIRouter()
 
 MAX_CONNECTIONS_PER_JOB = int(os.getenv("SPARC_WS_MAX_PER_JOB", "10"))
 MAX_TOTAL_CONNECTIONS = int(os.getenv("SPARC_WS_MAX_TOTAL", "100"))
+COALESCE_INTERVAL = float(os.getenv("SPARC_WS_COALESCE_MS", "50")) / 1000
+# Celery workers publish progress on sparc:progress:<job_id> (see workers/pipeline.py)
+PROGRESS_CHANNEL_PREFIX = "sparc:progress:"
 
 
 class ConnectionManager:
     """Manage WebSocket connections with limits and thread safety."""
 
     def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # Weak so sockets dropped without a clean disconnect are reclaimed by GC
+        self.active_connections: dict[str, WeakSet[WebSocket]] = {}
         self._lock = asyncio.Lock()
+        # Pending messages for the drainer, keyed by job; only these jobs are visited
+        self._pending: dict[str, list[dict]] = {}
+        # Created by run_drainer inside the running loop; None while no drainer runs
+        self._dirty: Optional[asyncio.Event] = None
 
     @property
     def total_connections(self) -> int:
@@ -31,12 +41,13 @@ class ConnectionManager:
     async def connect(self, websocket: WebSocket, job_id: str) -> bool:
         """Accept and register a WebSocket connection. Returns False if limit exceeded."""
         async with self._lock:
+            self._reap_empty_locked()
             if self.total_connections >= MAX_TOTAL_CONNECTIONS:
                 logger.warning("WebSocket connection rejected: total limit reached (%d)", MAX_TOTAL_CONNECTIONS)
                 await websocket.close(code=1013, reason="Server at capacity")
                 return False
 
-            job_conns = self.active_connections.get(job_id, set())
+            job_conns = self.active_connections.get(job_id, ())
             if len(job_conns) >= MAX_CONNECTIONS_PER_JOB:
                 logger.warning("WebSocket connection rejected for job %s: per-job limit reached (%d)",
                                job_id, MAX_CONNECTIONS_PER_JOB)
@@ -45,7 +56,7 @@ class ConnectionManager:
 
             await websocket.accept()
             if job_id not in self.active_connections:
-                self.active_connections[job_id] = set()
+                self.active_connections[job_id] = WeakSet()
             self.active_connections[job_id].add(websocket)
 
         logger.info("WebSocket connected for job %s (total=%d)", job_id, self.total_connections)
@@ -63,14 +74,26 @@ class ConnectionManager:
     async def broadcast(self, job_id: str, message: dict):
         """Broadcast a message to all clients for a job."""
         async with self._lock:
-            connections = self.active_connections.get(job_id, set()).copy()
+            connections = list(self.active_connections.get(job_id, ()))
 
-        dead_connections = set()
-        for connection in connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                dead_connections.add(connection)
+        if not connections:
+            return
+
+        # Encode once for all clients; the frontend reads frames as text
+        payload = orjson.dumps(
+            message, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+
+        # Send to every client concurrently so one slow socket doesn't stall the rest
+        results = await asyncio.gather(
+            *(connection.send_text(payload) for connection in connections),
+            return_exceptions=True,
+        )
+        dead_connections = {
+            connection
+            for connection, result in zip(connections, results)
+            if isinstance(result, Exception)
+        }
 
         if dead_connections:
             async with self._lock:
@@ -79,6 +102,52 @@ class ConnectionManager:
                     if not self.active_connections[job_id]:
                         del self.active_connections[job_id]
 
+    async def publish(self, job_id: str, message: dict):
+        """Queue a message for the drainer, or broadcast it now if no drainer runs."""
+        if job_id not in self.active_connections:
+            return
+        if self._dirty is None:
+            await self.broadcast(job_id, message)
+            return
+
+        self._pending.setdefault(job_id, []).append(message)
+        self._dirty.set()
+
+    async def run_drainer(self):
+        """Broadcast queued messages, coalescing bursts of progress updates per job."""
+        self._dirty = asyncio.Event()
+        try:
+            while True:
+                await self._dirty.wait()
+                # Let a burst accumulate, bounding the added latency
+                if COALESCE_INTERVAL > 0:
+                    await asyncio.sleep(COALESCE_INTERVAL)
+                self._dirty.clear()
+                pending, self._pending = self._pending, {}
+
+                await asyncio.gather(*(
+                    self._broadcast_all(job_id, _coalesce(messages))
+                    for job_id, messages in pending.items()
+                ))
+                async with self._lock:
+                    self._reap_empty_locked()
+        finally:
+            self._dirty = None
+
+    def _reap_empty_locked(self):
+        """Drop jobs whose connections have all been garbage collected (hold _lock)."""
+        for job_id, conns in list(self.active_connections.items()):
+            if not conns:
+                del self.active_connections[job_id]
+
+    async def _broadcast_all(self, job_id: str, messages: list[dict]):
+        """Broadcast messages for one job in order."""
+        for message in messages:
+            try:
+                await self.broadcast(job_id, message)
+            except Exception:
+                logger.exception("Broadcast failed for job %s", job_id)
+
     async def cleanup_all(self):
         """Close all connections (for graceful shutdown)."""
         async with self._lock:
@@ -97,6 +166,25 @@ class ConnectionManager:
         logger.info("All WebSocket connections closed")
 
 
+def _coalesce(messages: list[dict]) -> list[dict]:
+    """Merge runs of progress frames into one (max progress, latest message).
+
+    Other frames are kept, and order around them is preserved.
+    """
+    merged: list[dict] = []
+    for message in messages:
+        previous = merged[-1] if merged else None
+        if (
+            message.get("type") == "progress"
+            and previous is not None
+            and previous.get("type") == "progress"
+        ):
+            merged[-1] = {**message, "progress": max(previous["progress"], message["progress"])}
+        else:
+            merged.append(message)
+    return merged
+
+
 manager = ConnectionManager()
 
 
@@ -107,14 +195,13 @@ async def websocket_pipeline_progress(websocket: WebSocket, job_id: str):
     if not connected:
         return
 
+    # Dead peers are detected by the server's protocol-level pings
+    # (ws_ping_interval/ws_ping_timeout); app-level "ping" is answered for clients
     try:
         while True:
-            try:
-                data = await asyncio.wait_for(websocket.receive_json(), timeout=30.0)
-                if data.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
-            except asyncio.TimeoutError:
-                await websocket.send_json({"type": "heartbeat"})
+            data = await websocket.receive_json()
+            if data.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
     except WebSocketDisconnect:
         await manager.disconnect(websocket, job_id)
     except Exception:
@@ -123,7 +210,7 @@ async def websocket_pipeline_progress(websocket: WebSocket, job_id: str):
 
 async def send_progress_update(job_id: str, progress: float, message: str, status: str = "running"):
     """Send a progress update to all connected clients."""
-    await manager.broadcast(job_id, {
+    await manager.publish(job_id, {
         "type": "progress", "job_id": job_id,
         "progress": progress, "message": message, "status": status,
     })
@@ -131,9 +218,52 @@ async def send_progress_update(job_id: str, progress: float, message: str, statu
 
 async def send_result(job_id: str, result: dict):
     """Send pipeline result to all connected clients."""
-    await manager.broadcast(job_id, {"type": "result", "job_id": job_id, "result": result})
+    await manager.publish(job_id, {"type": "result", "job_id": job_id, "result": result})
 
 
 async def send_qc_update(job_id: str, qc_data: dict):
     """Send real-time QC metrics update to all connected clients."""
-    await manager.broadcast(job_id, {"type": "qc_update", "job_id": job_id, "qc_data": qc_data})
+    await manager.publish(job_id, {"type": "qc_update", "job_id": job_id, "qc_data": qc_data})
+
+
+async def _relay_update(job_id: str, update: dict):
+    """Forward one worker update: a terminal result frame or a progress update."""
+    if update.get("type") == "result":
+        await send_result(job_id, update["result"])
+    else:
+        await send_progress_update(
+            job_id, update["progress"], update["message"], update.get("status", "running"),
+        )
+
+
+async def relay_progress(redis_url: str):
+    """Forward progress published by Celery workers on Redis to WebSocket clients."""
+    import redis.asyncio as aioredis
+    from redis.exceptions import ConnectionError as RedisConnectionError
+
+    client = aioredis.Redis.from_url(redis_url, decode_responses=True)
+    try:
+        while True:
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{PROGRESS_CHANNEL_PREFIX}*")
+                    async for event in pubsub.listen():
+                        if event["type"] != "pmessage":
+                            continue
+                        job_id = event["channel"][len(PROGRESS_CHANNEL_PREFIX):]
+                        try:
+                            await _relay_update(job_id, orjson.loads(event["data"]))
+                        except (orjson.JSONDecodeError, KeyError, TypeError):
+                            logger.warning("Ignoring malformed progress update for job %s", job_id)
+                        except Exception:
+                            logger.exception("Failed to relay progress update for job %s", job_id)
+            except RedisConnectionError:
+                logger.warning("Lost Redis progress subscription, retrying in 1s")
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Progress relay failed, retrying in 1s")
+                await asyncio.sleep(1)
+    finally:
+        await client.aclose()
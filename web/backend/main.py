@@ -14,8 +14,8 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from api.routes import router, _USE_REDIS
-from api.websocket import websocket_router
+from api.routes import router, _USE_REDIS, _USE_CELERY
+from api.websocket import websocket_router, manager as ws_manager, relay_progress
 
 # ─── Logging setup ────────────────────────────────────────────────────
 
@@ -35,6 +35,8 @@ ALLOWED_ORIGINS = [
     o.strip() for o in os.getenv("SPARC_CORS_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
     if o.strip()
 ]
+WS_PING_INTERVAL = float(os.getenv("SPARC_WS_PING_INTERVAL", "20"))
+WS_PING_TIMEOUT = float(os.getenv("SPARC_WS_PING_TIMEOUT", "20"))
 
 # ─── Metrics (simple counters) ────────────────────────────────────────
 
@@ -63,8 +65,19 @@ async def lifespan(app: FastAPI):
     for sig in (signal.SIGTERM, signal.SIGINT):
         loop.add_signal_handler(sig, lambda s=sig: _handle_signal(s))
 
+    # Single task that coalesces and broadcasts WebSocket updates
+    ws_drainer = asyncio.create_task(ws_manager.run_drainer())
+    # Celery workers report progress over Redis pub/sub rather than the result backend
+    progress_relay = None
+    if _USE_CELERY:
+        progress_relay = asyncio.create_task(relay_progress(os.environ["REDIS_URL"]))
+
     yield
 
+    ws_drainer.cancel()
+    if progress_relay is not None:
+        progress_relay.cancel()
+
     logger.info("SPARC API shutting down — waiting for running pipelines...")
     _shutdown_event.set()
     # Give running pipelines up to 30s to complete
@@ -222,6 +235,10 @@ def main():
         host=host,
         port=port,
         reload=reload,
+        ws_ping_interval=WS_PING_INTERVAL,
+        ws_ping_timeout=WS_PING_TIMEOUT,
+        # Progress frames are tiny; per-connection zlib state costs more than it saves
+        ws_per_message_deflate=False,
     )
 
 
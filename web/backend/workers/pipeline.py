@@ -2,20 +2,32 @@
 Background pipeline worker using Celery.
 """
 
+import asyncio
+import functools
 import json
 import logging
 import os
+import time
 from collections import defaultdict
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# Default output root, resolved once (same setting as the API's OUTPUT_DIR)
+OUTPUT_DIR = Path(
+    os.getenv("SPARC_OUTPUT_DIR", os.getenv("SCTOOLS_OUTPUT_DIR", "/tmp/sparc/outputs"))
+)
+
+# Hard time limit for one pipeline run (same setting as the API's PIPELINE_TIMEOUT)
+PIPELINE_TIMEOUT = int(os.getenv("SPARC_PIPELINE_TIMEOUT", "3600"))
+
 # Celery configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 try:
     from celery import Celery
+    from celery.exceptions import SoftTimeLimitExceeded
 
     celery_app = Celery(
         "sparc",
@@ -24,16 +36,25 @@ try:
     )
 
     celery_app.conf.update(
-        task_serializer="json",
-        accept_content=["json"],
-        result_serializer="json",
+        # msgpack is smaller and faster to encode; JSON is still accepted so
+        # messages queued by older producers keep working
+        task_serializer="msgpack",
+        accept_content=["msgpack", "json"],
+        result_serializer="msgpack",
         timezone="UTC",
         enable_utc=True,
         task_track_started=True,
-        task_time_limit=3600,  # 1 hour
+        task_time_limit=PIPELINE_TIMEOUT,
+        # Raised inside the task first, so it can still mark the job failed
+        task_soft_time_limit=max(PIPELINE_TIMEOUT - 60, 1),
         worker_prefetch_multiplier=1,
     )
 
+    import redis
+
+    # Job records shared with the API (see api/routes.py)
+    _job_store = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
     CELERY_AVAILABLE = True
 except ImportError:
     CELERY_AVAILABLE = False
@@ -56,16 +77,19 @@ def run_pipeline(
     r1_path: str,
     r2_path: Optional[str],
     whitelist_path: Optional[str],
-    output_dir: str,
+    output_dir: Union[str, "os.PathLike[str]", None],
     config: dict,
 ) -> dict:
     """
     Run the analysis pipeline.
 
     This is a synchronous function that can be called directly
-    or wrapped in a Celery task.
+    or wrapped in a Celery task. Outputs go to `output_dir`, or to
+    OUTPUT_DIR/<job_id> if it is not given.
     """
     try:
+        output_dir = Path(output_dir or OUTPUT_DIR / job_id)
+        output_dir.mkdir(parents=True, exist_ok=True)
         result = {
             "total_reads": 0,
             "valid_barcodes": 0,
@@ -87,7 +111,7 @@ def run_pipeline(
 
         # Try to use Rust bindings for performance
         try:
-            from sparc import Whitelist, BarcodeCorrector, FastqParser, GeneCounter
+            from sparc import Whitelist, BarcodeCorrector, GeneCounter
             return _run_with_rust(
                 job_id, r1_path, r2_path, whitelist_path, output_dir,
                 config, result, barcode_start, barcode_len, umi_start, umi_len,
@@ -111,7 +135,8 @@ def _run_with_rust(
     config, result, barcode_start, barcode_len, umi_start, umi_len,
 ):
     """Run pipeline using Rust bindings."""
-    from sparc import Whitelist, BarcodeCorrector, FastqParser, GeneCounter
+    from sparc import Whitelist, BarcodeCorrector, GeneCounter
+    from sparc._sparc_py import count_tagged_reads
 
     max_mismatch = config.get("max_mismatch", 1)
 
@@ -121,82 +146,36 @@ def _run_with_rust(
         whitelist = Whitelist(whitelist_path)
         corrector = BarcodeCorrector(whitelist, max_mismatch)
 
-    # Step 1: Extract barcodes from R1 and build count matrix
-    parser = FastqParser(r1_path)
+    # Steps 1-2: extract and correct barcodes from R1, then count unique UMIs
+    # per barcode-gene pair; the whole read loop runs in Rust
     counter = GeneCounter()
-
-    # Track barcode-UMI-gene associations
-    barcode_umi_gene = defaultdict(lambda: defaultdict(set))
-
-    for record in parser:
-        result["total_reads"] += 1
-
-        if len(record.seq) < barcode_start + barcode_len + umi_len:
-            continue
-
-        barcode_seq = record.subsequence(barcode_start, barcode_len)
-        umi_seq = record.subsequence(umi_start, umi_len)
-
-        if barcode_seq is None or umi_seq is None:
-            continue
-
-        barcode_str = bytes(barcode_seq).decode("ascii", errors="ignore")
-        umi_str = bytes(umi_seq).decode("ascii", errors="ignore")
-
-        # Match barcode
-        final_barcode = None
-        if corrector:
-            status, corrected, _ = corrector.match_barcode(barcode_str)
-            if status == "exact":
-                result["valid_barcodes"] += 1
-                final_barcode = corrected
-            elif status == "corrected":
-                result["valid_barcodes"] += 1
-                result["corrected_barcodes"] += 1
-                final_barcode = corrected
-            else:
-                result["invalid_barcodes"] += 1
-        else:
-            final_barcode = barcode_str
-            result["valid_barcodes"] += 1
-
-        if final_barcode:
-            # Extract gene info from read name if available
-            gene = _extract_gene_from_read(record.id)
-            if gene:
-                barcode_umi_gene[final_barcode][gene].add(umi_str)
-
-    # Step 2: UMI deduplication and count matrix building
-    for barcode, gene_umis in barcode_umi_gene.items():
-        for gene, umis in gene_umis.items():
-            # Count unique UMIs per barcode-gene pair
-            counter.add_count(barcode, gene, len(umis))
+    total, valid, corrected, invalid = count_tagged_reads(
+        r1_path, counter, corrector,
+        barcode_start=barcode_start, barcode_len=barcode_len,
+        umi_start=umi_start, umi_len=umi_len,
+    )
+    result["total_reads"] += total
+    result["valid_barcodes"] += valid
+    result["corrected_barcodes"] += corrected
+    result["invalid_barcodes"] += invalid
 
     # Step 3: Process R2 if available (gene assignment from alignment)
     if r2_path and Path(r2_path).exists():
         logger.info("R2 file available at %s", r2_path)
         # R2 processing would typically require alignment; counts already built from R1 tags
 
-    # Step 4: Build and write matrix
-    matrix = counter.build()
-    result["cells"] = matrix.n_cols
-    result["genes"] = matrix.n_rows
+    # Step 4: Stream the matrix straight to disk, collecting per-cell totals for QC
+    n_genes, n_cells, genes_per_cell, counts_per_cell = counter.stream_outputs(
+        str(output_dir), compress=config.get("compress_outputs", False),
+    )
+    result["cells"] = n_cells
+    result["genes"] = n_genes
 
     # Compute QC stats
-    if matrix.n_cols > 0:
+    if n_cells > 0:
         import numpy as np
-        genes_per_cell = np.array(matrix.genes_per_cell())
-        counts_per_cell = np.array(matrix.counts_per_cell())
-        result["median_genes_per_cell"] = int(np.median(genes_per_cell)) if len(genes_per_cell) > 0 else 0
-        result["median_umis_per_cell"] = int(np.median(counts_per_cell)) if len(counts_per_cell) > 0 else 0
-
-    # Save output
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-
-    matrix.write_mtx(str(output_path / "matrix.mtx"))
-    matrix.write_barcodes(str(output_path / "barcodes.tsv"))
-    matrix.write_genes(str(output_path / "genes.tsv"))
+        result["median_genes_per_cell"] = int(np.median(genes_per_cell))
+        result["median_umis_per_cell"] = int(np.median(counts_per_cell))
 
     # Write QC report
     qc_report = {
@@ -210,7 +189,7 @@ def _run_with_rust(
         "median_genes_per_cell": result["median_genes_per_cell"],
         "median_umis_per_cell": result["median_umis_per_cell"],
     }
-    with open(output_path / "qc_report.json", "w") as f:
+    with open(output_dir / "qc_report.json", "w") as f:
         json.dump(qc_report, f, indent=2)
 
     return result
@@ -232,10 +211,10 @@ def _run_pure_python(
     whitelist_set = set()
     if whitelist_path and Path(whitelist_path).exists():
         with open(whitelist_path) as f:
-            for line in f:
-                bc = line.strip()
-                if bc and not bc.startswith("#"):
-                    whitelist_set.add(bc)
+            lines = f.read().splitlines()
+        whitelist_set = {
+            bc for bc in map(str.strip, lines) if bc and not bc.startswith("#")
+        }
 
     # Parse FASTQ
     barcode_gene_counts = defaultdict(lambda: defaultdict(set))
@@ -243,33 +222,45 @@ def _run_pure_python(
     open_fn = gzip.open if r1_path.endswith(".gz") else open
     mode = "rt" if r1_path.endswith(".gz") else "r"
 
+    # Loop invariants, hoisted out of the per-read loop
+    min_len = barcode_start + barcode_len + umi_len
+    barcode_end = barcode_start + barcode_len
+    umi_end = umi_start + umi_len
+    extract_gene = _extract_gene_from_read
+    total_reads = valid_barcodes = invalid_barcodes = 0
+
     with open_fn(r1_path, mode) as f:
+        readline = f.readline
         while True:
-            header = f.readline().strip()
+            header = readline().strip()
             if not header:
                 break
-            seq = f.readline().strip()
-            f.readline()  # +
-            f.readline()  # qual
+            seq = readline().strip()
+            readline()  # +
+            readline()  # qual
 
-            result["total_reads"] += 1
+            total_reads += 1
 
-            if len(seq) < barcode_start + barcode_len + umi_len:
+            if len(seq) < min_len:
                 continue
 
-            barcode = seq[barcode_start:barcode_start + barcode_len]
-            umi = seq[umi_start:umi_start + umi_len]
+            barcode = seq[barcode_start:barcode_end]
+            umi = seq[umi_start:umi_end]
 
             if whitelist_set and barcode not in whitelist_set:
-                result["invalid_barcodes"] += 1
+                invalid_barcodes += 1
                 continue
 
-            result["valid_barcodes"] += 1
+            valid_barcodes += 1
 
-            gene = _extract_gene_from_read(header)
+            gene = extract_gene(header)
             if gene:
                 barcode_gene_counts[barcode][gene].add(umi)
 
+    result["total_reads"] += total_reads
+    result["valid_barcodes"] += valid_barcodes
+    result["invalid_barcodes"] += invalid_barcodes
+
     # Build count matrix
     all_barcodes = sorted(barcode_gene_counts.keys())
     all_genes = sorted({g for bc_genes in barcode_gene_counts.values() for g in bc_genes})
@@ -287,16 +278,18 @@ def _run_pure_python(
     result["cells"] = len(all_barcodes)
     result["genes"] = len(all_genes)
 
-    # Save
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
+    # Save (gzipped at the fastest level when requested)
+    compress = config.get("compress_outputs", False)
+    suffix = ".gz" if compress else ""
+    opener = functools.partial(gzip.open, compresslevel=1) if compress else open
 
     if rows:
         matrix = sp.coo_matrix(
             (np.array(vals, dtype=np.int32), (np.array(rows), np.array(cols))),
             shape=(len(all_genes), len(all_barcodes)),
         )
-        mmwrite(str(output_path / "matrix.mtx"), matrix)
+        with opener(output_dir / f"matrix.mtx{suffix}", "wb") as f:
+            mmwrite(f, matrix)
 
         # Compute QC
         genes_per_cell = np.diff(matrix.tocsc().indptr)
@@ -304,11 +297,11 @@ def _run_pure_python(
         result["median_genes_per_cell"] = int(np.median(genes_per_cell)) if len(genes_per_cell) > 0 else 0
         result["median_umis_per_cell"] = int(np.median(counts_per_cell)) if len(counts_per_cell) > 0 else 0
 
-    with open(output_path / "barcodes.tsv", "w") as f:
+    with opener(output_dir / f"barcodes.tsv{suffix}", "wt") as f:
         for bc in all_barcodes:
             f.write(f"{bc}\n")
 
-    with open(output_path / "genes.tsv", "w") as f:
+    with opener(output_dir / f"genes.tsv{suffix}", "wt") as f:
         for gene in all_genes:
             f.write(f"{gene}\t{gene}\n")
 
@@ -317,7 +310,7 @@ def _run_pure_python(
         "job_id": job_id,
         **{k: v for k, v in result.items()},
     }
-    with open(output_path / "qc_report.json", "w") as f:
+    with open(output_dir / "qc_report.json", "w") as f:
         json.dump(qc_report, f, indent=2)
 
     return result
@@ -333,6 +326,71 @@ def _extract_gene_from_read(read_id: str) -> Optional[str]:
     return None
 
 
+async def run_pipeline_async(**kwargs) -> dict:
+    """
+    Run the pipeline in a worker thread without blocking the event loop.
+
+    Takes the same keyword arguments as run_pipeline. Concurrency is capped
+    by the API's SPARC_MAX_CONCURRENT limit, not here.
+    """
+    return await asyncio.to_thread(run_pipeline, **kwargs)
+
+
+_TERMINAL_STATUSES = ("completed", "failed")
+
+
+def _update_job(job_id: str, **fields):
+    """Merge fields into the API's job record in Redis.
+
+    The read-modify-write runs in a WATCH/MULTI transaction (retried if the
+    record changes meanwhile), and a late update never moves a finished job
+    back to a non-terminal status.
+    """
+    key = f"sparc:job:{job_id}"
+
+    def merge(pipe):
+        data = pipe.get(key)
+        job = json.loads(data) if data else {"job_id": job_id}
+        finished = job.get("status") in _TERMINAL_STATUSES
+        if finished and fields.get("status") not in _TERMINAL_STATUSES:
+            return
+        job.update(fields)
+        pipe.multi()
+        pipe.set(key, json.dumps(job), ex=86400)
+
+    _job_store.transaction(merge, key)
+
+
+def _publish_progress(job_id: str, progress: float, message: str, status: str = "running"):
+    """Publish a progress update for the API to relay to WebSocket clients."""
+    # Channel read by api/websocket.py (relay_progress)
+    update = {"type": "progress", "progress": progress, "message": message, "status": status}
+    _job_store.publish(f"sparc:progress:{job_id}", json.dumps(update))
+
+
+def _publish_result(job_id: str, result: dict):
+    """Publish the final pipeline result on the job's progress channel."""
+    _job_store.publish(f"sparc:progress:{job_id}", json.dumps({"type": "result", "result": result}))
+
+
+def _finish_job(job_id: str, result: Optional[dict], failure_message: str):
+    """Record and announce a job's terminal status; errors are logged, not raised."""
+    try:
+        if result is not None and "error" not in result:
+            # Record the result before announcing it, so clients can fetch it right away
+            _update_job(
+                job_id, status="completed", progress=1.0,
+                message="Pipeline completed successfully", result=result,
+            )
+            _publish_progress(job_id, 1.0, "Pipeline completed", status="completed")
+            _publish_result(job_id, result)
+        else:
+            _update_job(job_id, status="failed", message=failure_message)
+            _publish_progress(job_id, 0.1, failure_message, status="failed")
+    except Exception:
+        logger.exception("Job %s: could not record final status", job_id)
+
+
 if CELERY_AVAILABLE:
 
     @celery_app.task(bind=True)
@@ -345,26 +403,39 @@ if CELERY_AVAILABLE:
         output_dir: str,
         config: dict,
     ):
-        """Celery task wrapper for pipeline."""
+        """Celery task wrapper for pipeline.
 
-        def update_progress(progress: float, message: str):
-            self.update_state(
-                state="PROGRESS",
-                meta={"progress": progress, "message": message},
+        The job record always ends "completed" or "failed", including when the
+        task raises or hits its soft time limit.
+        """
+        result = None
+        message = "Pipeline failed"
+        try:
+            # Progress goes out over pub/sub; only the final result is stored by Celery
+            _publish_progress(job_id, 0.1, "Starting pipeline...")
+            _update_job(
+                job_id, status="running", progress=0.1, message="Starting pipeline...",
+                started_at=time.time(),
             )
 
-        update_progress(0.1, "Starting pipeline...")
-
-        result = run_pipeline(
-            job_id=job_id,
-            r1_path=r1_path,
-            r2_path=r2_path,
-            whitelist_path=whitelist_path,
-            output_dir=output_dir,
-            config=config,
-        )
-
-        if "error" not in result:
-            update_progress(1.0, "Pipeline completed")
-
-        return result
+            result = run_pipeline(
+                job_id=job_id,
+                r1_path=r1_path,
+                r2_path=r2_path,
+                whitelist_path=whitelist_path,
+                output_dir=output_dir,
+                config=config,
+            )
+            if "error" in result:
+                message = f"Pipeline error: {result['error']}"
+            return result
+        except SoftTimeLimitExceeded:
+            message = "Pipeline timed out"
+            logger.error("Job %s: pipeline hit the soft time limit", job_id)
+            raise
+        except Exception as e:
+            message = f"Pipeline error: {e}"
+            logger.exception("Job %s: pipeline task failed", job_id)
+            raise
+        finally:
+            _finish_job(job_id, result, message)